@@ -1,7 +1,27 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
 
+from config_resource import app_config_from_env, enable_subscriptions
+
+load_dotenv()  # .envファイルから環境変数を読み込み
+# 設定ファイル（CONFIG_PATH）は1度だけ読み込み、変わったときだけ読み込み直す
+app_config = app_config_from_env()
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """起動している間は設定ファイルの変更を監視する"""
+    async with app_config.watching():
+        yield
+
+
 # FastMCPサーバを初期化
-mcp = FastMCP("Test Server")
+mcp = FastMCP("Test Server", lifespan=lifespan)
+# FastMCPには購読のデコレーターがないため、内部の低レベルServerに登録する
+enable_subscriptions(mcp._mcp_server, app_config)
 
 # サンプルツール：体重と身長を受取り、BMIを計算するツール
 @mcp.tool()
@@ -15,10 +35,10 @@ def review_code(code: str) -> str:
     return f"下記のコードをレビューしてください:\n\n{code}"
 
 # サンプルリソース：アプリのConfigデータを提供するリソース
-@mcp.resource("config://app")
+@mcp.resource("config://app", mime_type="application/json")
 def get_config() -> str:
-    """Static configuration data"""
-    return "App configuration data here"
+    """Application configuration (reloaded when the file changes)"""
+    return app_config.read()
 
 if __name__ == "__main__":
     mcp.run(transport="stdio")
\ No newline at end of file
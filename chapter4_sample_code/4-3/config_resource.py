@@ -0,0 +1,153 @@
+# lowlevel-server.pyとFastMCP.pyのconfig://appリソースで使う、設定ファイルの読み込みと変更通知の実装です。
+# - ファイルの内容は1度だけ読み込んでメモリに持ち、読み取りのたびにファイルを開かない
+# - 大きなファイルはmmapで読み込み、読み込み用のバッファを別に確保しない
+# - ファイルの変更を監視し、変わったら読み込み直して、購読（resources/subscribe）している
+#   クライアントにnotifications/resources/updatedを送る。クライアントは通知が来るまで内容をキャッシュできる
+import asyncio
+import mmap
+import os
+import weakref
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from pydantic import AnyUrl
+
+from mcp.server.lowlevel import Server
+from mcp.server.session import ServerSession
+
+
+class FileResource:
+    """ファイルの内容を返すリソース。watching()の間はファイルの変更を監視する"""
+
+    def __init__(self, uri: str, path: str, mmap_threshold: int = 1_000_000, interval: float = 1.0) -> None:
+        self.uri = uri
+        self.path = path
+        self.mmap_threshold = mmap_threshold  # このバイト数以上のファイルはmmapで読み込む
+        self.interval = interval  # 変更を確認する間隔（秒）
+        self.loads = 0  # ファイルを読み込んだ回数
+        self._text: str | None = None
+        self._version: tuple | None = None  # 読み込んだときのファイルの (更新時刻, 大きさ, inode)
+        self._subscribers: "weakref.WeakSet[ServerSession]" = weakref.WeakSet()
+        self._watchers = 0
+        self._task: asyncio.Task | None = None
+
+    def _stat(self) -> tuple | None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _load(self) -> None:
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size and st.st_size >= self.mmap_threshold:
+                # ファイルをメモリに写して、そこから直接文字列にする
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    text = str(mapped, "utf-8")
+            else:
+                text = f.read().decode("utf-8")
+        self._text = text
+        self._version = (st.st_mtime_ns, st.st_size, st.st_ino)
+        self.loads += 1
+
+    def read(self) -> str:
+        """ファイルの内容を返す（読み込むのは最初と、変更を検知したときだけ）"""
+        if self._text is None:
+            if self._stat() is None:
+                raise ValueError(f"リソースのファイルがありません: {self.path}")
+            self._load()
+        return self._text
+
+    def subscribe(self, session: ServerSession) -> None:
+        self._subscribers.add(session)
+
+    def unsubscribe(self, session: ServerSession) -> None:
+        self._subscribers.discard(session)
+
+    async def notify_updated(self) -> None:
+        """購読しているクライアントにnotifications/resources/updatedを送る"""
+        for session in list(self._subscribers):
+            try:
+                await session.send_resource_updated(AnyUrl(self.uri))
+            except Exception:
+                self._subscribers.discard(session)  # 切断済みのセッション
+
+    async def check(self) -> bool:
+        """ファイルが変わっていれば読み込み直して通知し、Trueを返す"""
+        version = self._stat()
+        if version == self._version:
+            return False
+        if version is None:
+            self._text = self._version = None  # 削除された（読み取りはエラーになる）
+        else:
+            try:
+                self._load()
+            except (OSError, UnicodeDecodeError):
+                return False  # 書き込み途中など。次の確認で読み込み直す
+        await self.notify_updated()
+        return True
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    @asynccontextmanager
+    async def watching(self) -> AsyncIterator["FileResource"]:
+        """with中はファイルを監視する（複数のセッションから使っても監視は1つだけ）"""
+        self._watchers += 1
+        if self._task is None:
+            if self._text is None and self._stat() is not None:
+                self._load()  # 変更の比較の基準にするため、先に読み込んでおく
+            self._task = asyncio.create_task(self._watch())
+        try:
+            yield self
+        finally:
+            self._watchers -= 1
+            if self._watchers == 0 and self._task is not None:
+                task, self._task = self._task, None
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+
+def enable_subscriptions(server: Server, *resources: FileResource) -> None:
+    """低レベルのServerにresources/subscribe・unsubscribeを登録し、購読できることを宣言する"""
+    by_uri = {resource.uri: resource for resource in resources}
+
+    @server.subscribe_resource()
+    async def handle_subscribe(uri: AnyUrl) -> None:
+        if str(uri) not in by_uri:
+            raise ValueError(f"Unknown resource: {uri}")
+        by_uri[str(uri)].subscribe(server.request_context.session)
+
+    @server.unsubscribe_resource()
+    async def handle_unsubscribe(uri: AnyUrl) -> None:
+        if str(uri) in by_uri:
+            by_uri[str(uri)].unsubscribe(server.request_context.session)
+
+    # SDKのServerは購読のハンドラーがあってもsubscribe=Falseと宣言するため、Trueにして返す
+    create_initialization_options = server.create_initialization_options
+
+    def create_options_with_subscribe(*args, **kwargs):
+        options = create_initialization_options(*args, **kwargs)
+        if options.capabilities.resources is not None:
+            options.capabilities.resources.subscribe = True
+        return options
+
+    server.create_initialization_options = create_options_with_subscribe
+
+
+def app_config_from_env() -> FileResource:
+    """環境変数の設定からconfig://appリソースを作る（lowlevel-server.pyとFastMCP.pyで共通）
+    - CONFIG_PATH: 元になる設定ファイル（既定ではこのディレクトリのapp_config.json）
+    - CONFIG_MMAP_THRESHOLD: mmapで読み込むファイルの大きさ（バイト）
+    - CONFIG_WATCH_INTERVAL: 変更を確認する間隔（秒）
+    """
+    path = os.getenv("CONFIG_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_config.json")
+    mmap_threshold = int(os.getenv("CONFIG_MMAP_THRESHOLD", "1000000"))
+    interval = float(os.getenv("CONFIG_WATCH_INTERVAL", "1"))
+    return FileResource("config://app", path, mmap_threshold, interval)
@@ -1,12 +1,61 @@
+import os
+import sys
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import anyio
+from dotenv import load_dotenv
 from pydantic import AnyUrl
 
 from mcp.server.lowlevel import Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 import mcp.types as types
 from mcp.server.stdio import stdio_server
 
+from config_resource import app_config_from_env, enable_subscriptions
+from web_fetcher import WebFetcher
+
+load_dotenv()  # .envファイルから環境変数を読み込み
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", "2000000"))  # 1ページで読み込む本文の上限（バイト）
+FETCH_MAX_CHARS = int(os.getenv("FETCH_MAX_CHARS", "20000"))  # ツールの結果として返すテキストの上限（文字）
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "20"))  # 1回の取得のタイムアウト（秒）
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "100"))  # 接続プール全体の接続数の上限
+FETCH_PER_HOST_LIMIT = int(os.getenv("FETCH_PER_HOST_LIMIT", "6"))  # 同じホストへの同時接続数の上限
+FETCH_CACHE_CHARS = int(os.getenv("FETCH_CACHE_CHARS", "20000000"))  # 条件付きGET用に保存するテキストの合計の上限（文字）
+DNS_CACHE_TTL = float(os.getenv("DNS_CACHE_TTL", "300"))  # 名前解決の結果をキャッシュする時間（秒）
+CHECK_TIMEOUT = float(os.getenv("CHECK_TIMEOUT", "10"))  # check_statusのURL1件あたりのタイムアウト（秒）
+CHECK_MAX_URLS = int(os.getenv("CHECK_MAX_URLS", "500"))  # check_statusで1回に確認できるURLの数の上限
+
+# 設定ファイル（CONFIG_PATH）は1度だけ読み込み、変わったときだけ読み込み直す
+app_config = app_config_from_env()
+
+
+@asynccontextmanager
+async def lifespan(server: Server) -> AsyncIterator[WebFetcher]:
+    """HTTPの接続プールはサーバーの起動時に1つだけ作り、全てのツール呼び出しで共有する。
+    起動している間は設定ファイルの変更も監視する
+    """
+    fetcher = WebFetcher(
+        max_bytes=FETCH_MAX_BYTES,
+        timeout=FETCH_TIMEOUT,
+        max_connections=FETCH_MAX_CONNECTIONS,
+        per_host_limit=FETCH_PER_HOST_LIMIT,
+        cache_chars=FETCH_CACHE_CHARS,
+        dns_ttl=DNS_CACHE_TTL,
+    )
+    try:
+        async with app_config.watching():
+            yield fetcher
+    finally:
+        await fetcher.aclose()
+        print(f"fetch stats: {fetcher.stats()}", file=sys.stderr)
+
+
 # サーバを初期化
-server = Server("Test Server")
+server = Server("Test Server", lifespan=lifespan)
+# config://appの購読を受け付け、設定ファイルが変わったらnotifications/resources/updatedを送る
+enable_subscriptions(server, app_config)
 
 
 @server.list_tools()
@@ -29,15 +78,20 @@ async def handle_list_tools() -> list[types.Tool]:
         ),
         types.Tool(
             name="check_status",
-            description="指定されたURLのHTTPステータスコードを確認する",
+            description="指定されたURL（複数可）のHTTPステータスコードを並行して確認し、ホストごとにまとめて返す",
             inputSchema={
                 "type": "object",
-                "required": ["url"],
                 "properties": {
+                    "urls": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "maxItems": CHECK_MAX_URLS,
+                        "description": "ステータスを確認するURLのリスト",
+                    },
                     "url": {
                         "type": "string",
-                        "description": "ステータスを確認するURL",
-                    }
+                        "description": "ステータスを確認するURL（1件だけの場合）",
+                    },
                 },
             },
         ),
@@ -52,16 +106,45 @@ async def handle_call_tool(
     if name == "fetch_website":  # Webサイトを取得してその内容を返す
         if "url" not in arguments:
             raise ValueError("Missing required argument 'url'")
-        # ここで実際のWebサイト取得処理を実装
-        page_text = "This is a sample content from the website."  # 仮の内容
-        return [types.TextContent(type="text", text=f"取得したWebサイトの内容: {page_text}")]
+        fetcher: WebFetcher = server.request_context.lifespan_context
+        page = await fetcher.fetch(arguments["url"])
+        header = [f"URL: {page.url}", f"Status: {page.status}", f"Content-Type: {page.content_type}"]
+        if page.title:
+            header.append(f"Title: {page.title}")
+        if not page.text:
+            # 画像などのテキストでない内容は、種類と大きさだけを返す
+            header.append(f"（テキストではない内容のため省略しました: {page.size} bytes）")
+        text = page.text[:FETCH_MAX_CHARS]
+        if page.truncated or len(page.text) > FETCH_MAX_CHARS:
+            text += "\n…（長いため以降を省略しました）"
+        return [types.TextContent(type="text", text="\n".join(header) + "\n\n" + text)]
 
     elif name == "check_status":  # 指定されたURLのHTTPステータスコードを返す
-        if "url" not in arguments:
-            raise ValueError("Missing required argument 'url'")
-        # ここで実際のステータス確認処理を実装
-        status = 200  # 仮のステータスコード
-        return [types.TextContent(type="text", text=f"ステータスコード: {status} OK for {arguments['url']}")]
+        urls = list(arguments.get("urls") or [])
+        if arguments.get("url"):
+            urls.insert(0, arguments["url"])
+        if not urls:
+            raise ValueError("Missing required argument 'urls'")
+        if len(urls) > CHECK_MAX_URLS:
+            raise ValueError(f"URLは{CHECK_MAX_URLS}件までです（{len(urls)}件）")
+        fetcher: WebFetcher = server.request_context.lifespan_context
+        started = time.monotonic()
+        results = await fetcher.check_many(urls, CHECK_TIMEOUT)
+        lines = []
+        ok = errors = 0
+        for host, host_results in results.items():
+            lines.append(f"[{host}]")
+            for r in host_results:
+                if r.error:
+                    errors += 1
+                    lines.append(f"  ERROR {r.url} ({r.error})")
+                    continue
+                ok += 1
+                redirect = f" -> {r.final_url}" if r.final_url != r.url else ""
+                lines.append(f"  {r.status} {r.reason} {r.url}{redirect} ({r.method}, {r.elapsed_ms:.0f} ms)")
+        elapsed = time.monotonic() - started
+        summary = f"{ok + errors}件のURLを確認しました（応答あり {ok} / エラー {errors}、{elapsed:.2f}秒）"
+        return [types.TextContent(type="text", text=summary + "\n" + "\n".join(lines))]
     else:
         raise ValueError(f"Unknown tool: {name}")
 
@@ -100,16 +183,16 @@ async def handle_list_resources() -> list[types.Resource]:
     """利用可能なリソースの一覧を返す"""
     return [
         types.Resource(
-            uri="config://app", name="App Configuration", description="アプリケーションの設定情報", mimeType="text/plain"
+            uri="config://app", name="App Configuration", description="アプリケーションの設定情報", mimeType="application/json"
         )
     ]
 
 
 @server.read_resource()
-async def handle_read_resource(uri: AnyUrl) -> str | bytes:
+async def handle_read_resource(uri: AnyUrl) -> list[ReadResourceContents]:
     """指定されたリソースの内容を返す"""
     if str(uri) == "config://app":
-        return "App configuration here"
+        return [ReadResourceContents(content=app_config.read(), mime_type="application/json")]
     else:
         raise ValueError(f"Unknown resource: {uri}")
 
@@ -0,0 +1,540 @@
+# lowlevel-server.pyのfetch_websiteツールで使う、Webページ取得の実装です。
+# - 1つのhttpx.AsyncClient（HTTP/2・Keep-Alive）をサーバー全体で共有し、接続を使い回す
+# - 本文は少しずつ読み、上限のバイト数に達したらそこで打ち切る
+# - Content-Typeやmetaタグの文字コードで文字列に直し、HTMLは本文のテキストだけにする
+# - 同じホストへの同時接続数を制限する
+# - ETag・Last-Modifiedを保存しておき、2回目以降は条件付きGETで変更がなければ保存した内容を返す
+# - check_statusツール用に、多数のURLのステータスをHEAD（だめなら1バイトだけのGET）で並行して確認する
+# - 名前解決の結果はTTLの間キャッシュし、同じホストへの新しい接続ごとにDNSを引かないようにする
+#   （httpxには名前解決を差し替える設定がないため、httpcoreの接続プールを自分で作ってPoolTransportで包む）
+import asyncio
+import ipaddress
+import re
+import socket
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+import httpcore
+import httpx
+from charset_normalizer import from_bytes
+
+USER_AGENT = "mcp-sample-fetcher/0.1 (+https://modelcontextprotocol.io)"
+
+# 文字列として扱うContent-Type（それ以外はバイナリとして種類と大きさだけを返す）
+TEXT_TYPES = ("text/", "application/json", "application/xml", "application/xhtml+xml", "application/javascript")
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+# テキストにしないタグ（中身ごと捨てる）
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "head"}
+# 前後で改行するタグ
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "tr", "ul",
+}
+# 中身のない（閉じタグのない）タグ
+VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "area", "base", "col", "embed", "source", "wbr"}
+
+# check_many()で、ホストを取り出せないURLをまとめるときの名前
+INVALID_URL_HOST = "(不正なURL)"
+
+# HEADに対応していないサーバーが返しがちなステータス（この場合はGETで確かめ直す）
+HEAD_FALLBACK_STATUSES = {400, 403, 405, 501}
+
+META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+
+
+class HTMLToText(HTMLParser):
+    """HTMLから本文のテキストだけを取り出す（空白をまとめ、ブロック要素ごとに改行する）"""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self._parts: list[str] = []
+        self._skip = 0  # 捨てるタグの中にいる深さ
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag == "title":
+            self._in_title = True
+        elif tag in SKIP_TAGS and tag not in VOID_TAGS:
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title":
+            self._in_title = False
+        elif tag in SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self._parts.append(data)
+
+    def text(self) -> str:
+        lines = []
+        for line in "".join(self._parts).split("\n"):
+            line = " ".join(line.split())
+            if line:
+                lines.append(line)
+        return "\n".join(lines)
+
+
+def html_to_text(html: str) -> tuple[str, str]:
+    """HTMLを (タイトル, 本文のテキスト) にする"""
+    parser = HTMLToText()
+    parser.feed(html)
+    parser.close()
+    return " ".join(parser.title.split()), parser.text()
+
+
+def detect_charset(body: bytes, content_type: str) -> str | None:
+    """Content-Type・metaタグの順に文字コードを探し、なければ内容から推定する"""
+    match = re.search(r"charset\s*=\s*[\"']?([\w.:-]+)", content_type, re.IGNORECASE)
+    if match:
+        return match.group(1)
+    if content_type.startswith(HTML_TYPES) or not content_type:
+        match = META_CHARSET.search(body[:4096])
+        if match:
+            return match.group(1).decode("ascii", "ignore")
+    best = from_bytes(body[:65536]).best()
+    return best.encoding if best else None
+
+
+def decode_body(body: bytes, content_type: str) -> str:
+    """本文を文字列にする（打ち切りで途中になった文字は置き換える）"""
+    charset = detect_charset(body, content_type) or "utf-8"
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:  # 知らない文字コード名
+        return body.decode("utf-8", errors="replace")
+
+
+@dataclass
+class FetchResult:
+    """fetch()の結果"""
+
+    url: str  # リダイレクト後のURL
+    status: int
+    content_type: str
+    title: str
+    text: str
+    size: int  # 読み込んだ本文のバイト数
+    truncated: bool  # 上限のバイト数で打ち切ったかどうか
+    cached: bool = False  # 条件付きGETで変更がなく、保存した内容を返したかどうか
+
+
+@dataclass
+class _CacheEntry:
+    etag: str | None
+    last_modified: str | None
+    result: FetchResult
+    weight: int  # 保存している文字数
+
+
+class ConditionalCache:
+    """ETag・Last-Modifiedのある応答を保存するLRUキャッシュ（合計の文字数で上限を決める）"""
+
+    def __init__(self, max_chars: int) -> None:
+        self.max_chars = max_chars
+        self.chars = 0
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+
+    def get(self, url: str) -> _CacheEntry | None:
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+        return entry
+
+    def put(self, url: str, etag: str | None, last_modified: str | None, result: FetchResult) -> None:
+        self.discard(url)
+        weight = len(result.text)
+        if weight > self.max_chars:
+            return
+        self._entries[url] = _CacheEntry(etag, last_modified, result, weight)
+        self.chars += weight
+        while self.chars > self.max_chars:
+            self.discard(next(iter(self._entries)))
+
+    def discard(self, url: str) -> None:
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self.chars -= entry.weight
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@dataclass
+class StatusResult:
+    """check()の結果"""
+
+    url: str
+    status: int | None = None
+    reason: str = ""
+    final_url: str = ""  # リダイレクト後のURL
+    method: str = ""  # 最終的にステータスを得たメソッド（HEADかGET）
+    elapsed_ms: float = 0.0
+    error: str | None = None  # タイムアウトや接続エラー
+
+
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """名前解決の結果をTTLの間キャッシュするネットワークバックエンド。
+    同じホストの名前解決が同時に起きた場合は、1回の問い合わせを全員で待ちます。
+    TLSのSNIと証明書の検証はhttpcoreが元のホスト名で行うため、IPアドレスに接続しても問題ありません。
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, ttl: float = 300.0) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self._cache: dict[tuple[str, int], tuple[float, list[str]]] = {}
+        self._pending: dict[tuple[str, int], asyncio.Future] = {}
+        self.lookups = 0  # 実際にDNSを引いた回数
+        self.hits = 0  # キャッシュ（または同時の問い合わせ）で済んだ回数
+
+    async def resolve(self, host: str, port: int) -> list[str]:
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+        key = (host, port)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            self.lookups += 1
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            self._cache[key] = (time.monotonic() + self.ttl, addresses)
+            future.set_result(addresses)
+            return addresses
+        except BaseException as e:
+            # 問い合わせた本人が取り消された場合も、待っている他の接続は取り消さずにエラーにする
+            if isinstance(e, asyncio.CancelledError):
+                e = httpcore.ConnectError(f"名前解決が中断されました: {host}")
+            future.set_exception(e)
+            future.exception()  # 待っている人がいなくても警告を出さない
+            raise
+        finally:
+            del self._pending[key]
+
+    async def connect_tcp(
+        self, host, port, timeout=None, local_address=None, socket_options=None
+    ) -> httpcore.AsyncNetworkStream:
+        try:
+            addresses = await self.resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+        error: Exception | None = None
+        for address in addresses:  # 接続できなければ次のアドレスを試す
+            try:
+                return await self.backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        if error is None:
+            raise httpcore.ConnectError(f"名前解決の結果にアドレスがありません: {host}")
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None) -> httpcore.AsyncNetworkStream:
+        return await self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self.backend.sleep(seconds)
+
+
+# httpcoreの例外に対応するhttpxの例外（サブクラスを先に並べ、最初に当てはまったものを使う）
+HTTPCORE_ERRORS: list[tuple[type[Exception], type[httpx.HTTPError]]] = [
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+]
+
+
+def to_httpx_error(e: Exception) -> Exception:
+    """httpcoreの例外を、呼び出し側がhttpx.HTTPErrorとして扱えるように置き換える"""
+    for core_error, httpx_error in HTTPCORE_ERRORS:
+        if isinstance(e, core_error):
+            return httpx_error(str(e))
+    return e
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream) -> None:
+        self.stream = stream
+
+    async def __aiter__(self):
+        try:
+            async for part in self.stream:
+                yield part
+        except Exception as e:
+            raise to_httpx_error(e) from e
+
+    async def aclose(self) -> None:
+        if hasattr(self.stream, "aclose"):
+            await self.stream.aclose()
+
+
+class PoolTransport(httpx.AsyncBaseTransport):
+    """自分で作ったhttpcoreの接続プールを、httpx.AsyncClientから使うためのトランスポート。
+    httpx.AsyncHTTPTransportはネットワークバックエンドを指定できないため、
+    CachingDNSBackendを渡した接続プールをこれで包んで使います。
+    """
+
+    def __init__(self, pool: httpcore.AsyncConnectionPool) -> None:
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        try:
+            response = await self.pool.handle_async_request(core_request)
+        except Exception as e:
+            raise to_httpx_error(e) from e
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=_ResponseStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+
+@dataclass
+class _HostLimit:
+    semaphore: asyncio.Semaphore
+    users: int = 0  # セマフォを持っているか待っているリクエストの数
+
+
+class WebFetcher:
+    """Webページを取得する。サーバーの起動時に1つ作り、終了時にaclose()で接続を閉じる"""
+
+    def __init__(
+        self,
+        max_bytes: int = 2_000_000,
+        timeout: float = 20.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        per_host_limit: int = 6,
+        cache_chars: int = 20_000_000,
+        dns_ttl: float = 300.0,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.per_host_limit = per_host_limit
+        # httpxには名前解決を差し替える設定がないため、名前解決をキャッシュするバックエンドで接続プールを作ります。
+        self.dns = CachingDNSBackend(httpcore.AnyIOBackend(), dns_ttl)
+        pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=5.0,
+            http1=True,
+            http2=True,
+            network_backend=self.dns,
+        )
+        self.client = httpx.AsyncClient(
+            transport=PoolTransport(pool),
+            follow_redirects=True,
+            timeout=httpx.Timeout(timeout),
+            headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"},
+        )
+        self.cache = ConditionalCache(cache_chars)
+        self._host_limits: dict[str, _HostLimit] = {}  # 使われている間だけ持つ
+        self.requests = 0
+        self.not_modified = 0  # 条件付きGETで304が返った回数
+        self.bytes_read = 0
+
+    @asynccontextmanager
+    async def host_limit(self, url: str):
+        """ホストごとの同時接続数を制限する。
+        セマフォは使っているリクエストがある間だけ持ち、多くのホストに接続しても増え続けないようにします。
+        """
+        host = urlsplit(url).netloc.lower()
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = _HostLimit(asyncio.Semaphore(self.per_host_limit))
+        limit.users += 1
+        try:
+            async with limit.semaphore:
+                yield
+        finally:
+            limit.users -= 1
+            if limit.users == 0:
+                del self._host_limits[host]
+
+    async def fetch(self, url: str) -> FetchResult:
+        """URLの内容を取得する。HTMLは本文のテキストにして返す"""
+        if urlsplit(url).scheme not in ("http", "https"):
+            raise ValueError(f"http/httpsのURLを指定してください: {url}")
+        headers = {}
+        cached = self.cache.get(url)
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        async with self.host_limit(url):
+            self.requests += 1
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached is not None:
+                    self.not_modified += 1
+                    return FetchResult(**{**cached.result.__dict__, "cached": True})
+                body, truncated = await self._read(response)
+
+        content_type = response.headers.get("Content-Type", "").lower()
+        title, text = "", ""
+        if content_type.startswith(TEXT_TYPES) or not content_type:
+            text = decode_body(body, content_type)
+            if content_type.startswith(HTML_TYPES) or (not content_type and "<html" in text[:1024].lower()):
+                title, text = html_to_text(text)
+        result = FetchResult(
+            url=str(response.url),
+            status=response.status_code,
+            content_type=content_type,
+            title=title,
+            text=text,
+            size=len(body),
+            truncated=truncated,
+        )
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if response.status_code == 200 and (etag or last_modified) and "no-store" not in cache_control:
+            self.cache.put(url, etag, last_modified, result)
+        else:
+            self.cache.discard(url)
+        return result
+
+    async def _read(self, response: httpx.Response) -> tuple[bytes, bool]:
+        """本文をmax_bytesまで少しずつ読み、(本文, 打ち切ったかどうか) を返す。
+        上限を超えたら残りは読まずに接続を閉じます。
+        """
+        chunks: list[bytes] = []
+        size = 0
+        truncated = False
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > self.max_bytes:
+                truncated = True
+                break
+        self.bytes_read += size
+        return b"".join(chunks)[: self.max_bytes], truncated
+
+    async def check(self, url: str, timeout: float) -> StatusResult:
+        """URLのステータスをHEADで確認する。HEADに対応していないサーバーには1バイトだけのGETで確かめ直す。
+        timeoutはホストの空きを待つ時間を含まない、このURLだけの上限です。
+        """
+        result = StatusResult(url)
+        try:
+            scheme = urlsplit(url).scheme
+        except ValueError as e:  # "http://[::1/" のように解析できないURL
+            result.error = f"URLが不正です: {e}"
+            return result
+        if scheme not in ("http", "https"):
+            result.error = "http/httpsのURLではありません"
+            return result
+        async with self.host_limit(url):
+            started = time.monotonic()
+            try:
+                async with asyncio.timeout(timeout):
+                    response = None
+                    try:
+                        self.requests += 1
+                        response = await self.client.head(url)
+                    except httpx.RemoteProtocolError:
+                        pass  # HEADに正しく応答しないサーバー
+                    if response is None or response.status_code in HEAD_FALLBACK_STATUSES:
+                        self.requests += 1
+                        async with self.client.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+                            if response.status_code == 206:
+                                await response.aread()  # 1バイトだけなので読み切って接続を使い回す
+            except TimeoutError:
+                result.error = f"timeout ({timeout:g}s)"
+            except httpx.HTTPError as e:
+                result.error = str(e) or type(e).__name__
+            else:
+                result.status = response.status_code
+                result.reason = response.reason_phrase
+                result.final_url = str(response.url)
+                result.method = response.request.method
+            result.elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    async def check_many(self, urls: list[str], timeout: float) -> dict[str, list[StatusResult]]:
+        """複数のURLのステータスを並行して確認し、ホストごとにまとめて返す（重複したURLは1回だけ確認する）。
+        同じホストへの確認はhost_limit()の数ずつ、共有の接続を使い回しながら行います。
+        """
+        by_host: dict[str, list[str]] = {}
+        for url in dict.fromkeys(urls):
+            try:
+                host = urlsplit(url).netloc.lower() or INVALID_URL_HOST
+            except ValueError:
+                host = INVALID_URL_HOST  # check()がエラーの結果を返す
+            by_host.setdefault(host, []).append(url)
+        tasks = {
+            host: [asyncio.create_task(self.check(url, timeout)) for url in host_urls]
+            for host, host_urls in by_host.items()
+        }
+        try:
+            return {host: list(await asyncio.gather(*host_tasks)) for host, host_tasks in tasks.items()}
+        finally:
+            for host_tasks in tasks.values():
+                for task in host_tasks:
+                    task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "bytes_read": self.bytes_read,
+            "cached_pages": len(self.cache),
+            "dns_lookups": self.dns.lookups,
+            "dns_hits": self.dns.hits,
+            "active_hosts": len(self._host_limits),
+        }
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
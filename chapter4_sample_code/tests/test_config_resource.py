@@ -0,0 +1,34 @@
+import asyncio
+import os
+
+from config_resource import app_config_from_env
+
+
+def test_app_config_from_env_reads_settings(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    path.write_text('{"debug": false}', encoding="utf-8")
+    monkeypatch.setenv("CONFIG_PATH", str(path))
+    monkeypatch.setenv("CONFIG_MMAP_THRESHOLD", "1")
+    monkeypatch.setenv("CONFIG_WATCH_INTERVAL", "0.5")
+    resource = app_config_from_env()
+    assert (resource.uri, resource.path, resource.mmap_threshold, resource.interval) == (
+        "config://app", str(path), 1, 0.5
+    )
+    assert resource.read() == '{"debug": false}'
+
+
+def test_check_reloads_changed_file(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    path.write_text('{"debug": false}', encoding="utf-8")
+    monkeypatch.setenv("CONFIG_PATH", str(path))
+    resource = app_config_from_env()
+    assert resource.read() == '{"debug": false}'
+    path.write_text('{"debug": true, "level": 2}', encoding="utf-8")
+    assert asyncio.run(resource.check())
+    assert resource.read() == '{"debug": true, "level": 2}'
+    assert resource.loads == 2
+
+
+def test_default_path_is_next_to_the_module(monkeypatch):
+    monkeypatch.delenv("CONFIG_PATH", raising=False)
+    assert os.path.basename(app_config_from_env().path) == "app_config.json"
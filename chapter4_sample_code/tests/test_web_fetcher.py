@@ -0,0 +1,117 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from web_fetcher import WebFetcher, html_to_text
+
+PAGE = "<html><head><title>テスト</title><script>var x;</script></head><body><p>こんにちは</p></body></html>"
+
+
+class Site:
+    """ETag・Last-Modifiedに対応したローカルのWebサーバー"""
+
+    def __init__(self) -> None:
+        self.etag = '"v1"'
+        self.body = PAGE.encode("shift_jis")
+        self.requests: list[dict] = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                site.requests.append(dict(self.headers))
+                if self.path == "/big":
+                    self._send(200, b"x" * 100_000, "text/plain")
+                elif self.headers.get("If-None-Match") == site.etag:
+                    self.send_response(304)
+                    self.send_header("ETag", site.etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                else:
+                    self._send(200, site.body, "text/html; charset=shift_jis", ETag=site.etag)
+
+            def _send(self, status: int, body: bytes, content_type: str, **headers) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://localhost:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def site():
+    site = Site()
+    yield site
+    site.httpd.shutdown()
+    site.httpd.server_close()
+
+
+def fetch_all(*urls, **options):
+    async def main():
+        fetcher = WebFetcher(**options)
+        try:
+            return [await fetcher.fetch(url) for url in urls], fetcher.stats()
+        finally:
+            await fetcher.aclose()
+
+    return asyncio.run(main())
+
+
+def test_second_fetch_uses_conditional_get(site):
+    (first, second), stats = fetch_all(f"{site.url}/page", f"{site.url}/page")
+    assert (first.title, first.text, first.cached) == ("テスト", "こんにちは", False)
+    assert second.cached and second.text == first.text
+    assert site.requests[1]["If-None-Match"] == '"v1"'
+    assert stats["not_modified"] == 1
+    assert stats["dns_lookups"] == 1
+
+
+def test_changed_page_is_fetched_again(site):
+    async def main():
+        fetcher = WebFetcher()
+        try:
+            first = await fetcher.fetch(f"{site.url}/page")
+            site.etag = '"v2"'
+            site.body = PAGE.replace("こんにちは", "さようなら").encode("shift_jis")
+            return first, await fetcher.fetch(f"{site.url}/page")
+        finally:
+            await fetcher.aclose()
+
+    first, second = asyncio.run(main())
+    assert (first.text, second.text, second.cached) == ("こんにちは", "さようなら", False)
+
+
+def test_body_is_cut_at_max_bytes(site):
+    (result,), stats = fetch_all(f"{site.url}/big", max_bytes=1000)
+    assert result.truncated and result.size == 1000 and len(result.text) == 1000
+    assert stats["bytes_read"] < 100_000
+
+
+def test_check_many_reports_bad_urls_per_entry(site):
+    async def main():
+        fetcher = WebFetcher()
+        try:
+            return await fetcher.check_many([f"{site.url}/page", "http://[::1/", "ftp://example.com/"], 5)
+        finally:
+            await fetcher.aclose()
+
+    results = {r.url: r for host_results in asyncio.run(main()).values() for r in host_results}
+    assert results[f"{site.url}/page"].status == 200
+    assert "URL" in results["http://[::1/"].error
+    assert results["ftp://example.com/"].error
+
+
+def test_html_to_text_skips_scripts():
+    assert html_to_text(PAGE) == ("テスト", "こんにちは")
@@ -6,27 +6,58 @@ import json
 import logging
 # オペレーティングシステム（OS）の機能（環境変数の読み込みなど）を利用するためのライブラリをインポートします。
 import os
+# 時間を計測するためのライブラリをインポートします。
+import time
 # 非同期コンテキストマネージャを安全に管理するためのライブラリをインポートします。
 from contextlib import AsyncExitStack
+# 複数の値をまとめて扱うためのデータクラスをインポートします。
+from dataclasses import dataclass
 # 型ヒントを定義するためのライブラリをインポートします。コードの可読性と保守性を高めます。
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any
 
 # .envファイルから環境変数を読み込むためのライブラリをインポートします。APIキーなどを安全に管理できます。
 from dotenv import load_dotenv
-# OpenAIのAPIと対話するためのライブラリをインポートします。
-from openai import OpenAI
+# HTTP通信のタイムアウトや接続プールを設定するためのライブラリをインポートします。
+import httpx
+# OpenAIのAPIと非同期で対話するためのライブラリをインポートします。
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 # OpenAI APIからの応答の型をインポートします。
 from openai.types.responses import Response, ResponseFunctionToolCall
 # データモデルを定義するためのライブラリをインポートします。データのバリデーション（検証）などに使います。
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 
 # MCP (Model Context Protocol) クライアントセッション、エラー、標準入出力サーバーパラメータをインポートします。
 # これらはLLMがツールと通信するための基盤となります。
 from mcp import ClientSession, McpError, StdioServerParameters
 # MCPクライアントの標準入出力実装をインポートします。
 from mcp.client.stdio import stdio_client
-# MCPのツールの型定義をインポートします。
-from mcp.types import Tool
+# MCPクライアントのStreamable HTTP実装をインポートします（URLで指定したサーバーに接続します）。
+from mcp.client.streamable_http import streamablehttp_client
+# MCPのツールの型定義と、ツール呼び出しのリクエストの型をインポートします。
+from mcp.types import (
+    CallToolRequest,
+    CallToolRequestParams,
+    CallToolResult,
+    ClientRequest,
+    RequestParams,
+    Tool,
+)
+
+# MCPサーバーの生存確認と自動再起動を行うスーパーバイザーをインポートします。
+from server_supervisor import ServerSupervisor, is_transport_error
+# 同じMCPサーバーの複数のプロセス（レプリカ）に呼び出しを振り分けるプールをインポートします。
+from replica_pool import LEAST_OUTSTANDING, ReplicaPool
+
+# ツールの一覧（マニフェスト）をディスクに保存するキャッシュをインポートします。
+from tool_manifest_cache import ToolManifestCache, manifest_key
+# OpenAIのツール名から呼び出し先を引くための登録簿（レジストリ）をインポートします。
+from tool_registry import ToolArgumentError, ToolRegistry, UnknownToolError
+# ツールの出力を決められた文字数に収めるためのモジュールをインポートします。
+from tool_output import ToolOutput, fit_to_budget, render_contents
+# ツールの実行結果をホスト側で使い回すためのキャッシュをインポートします。
+from tool_result_cache import CachePolicy, ToolResultCache, cache_key, requests_bypass, resolve_policy
+# 処理の段階ごとの所要時間（スパン）を記録するトレーサーをインポートします。
+from tracing import Tracer
 
 # --- APIキーを.envファイルから読み込む ---
 # .envファイルから環境変数を読み込みます。
@@ -34,6 +65,15 @@ from mcp.types import Tool
 load_dotenv()
 # OpenAI APIキーを環境変数から取得します。
 API_KEY = os.getenv("OPENAI_API_KEY")
+# OpenAI APIのタイムアウト（秒）を環境変数から取得します。
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+# OpenAI APIとの接続プールの大きさ（同時接続数・使い回す接続数）を環境変数から取得します。
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+# LLMの応答をストリーミングで受け取るかどうかを環境変数から取得します（既定では受け取らず、従来どおり応答全体を待ちます）。
+# ストリーミングでは回答を届いた順に表示し、ツール呼び出しは引数がそろった時点で実行を始めます。
+OPENAI_STREAM = os.getenv("OPENAI_STREAM", "false").lower() in {"1", "true", "yes"}
 
 # --- ロギング設定を追加 ---
 # ロギング設定を行います。
@@ -46,11 +86,48 @@ logging.basicConfig(
 # ロガーインスタンスを作成します。これを使ってログメッセージを出力します。
 logger = logging.getLogger(__name__)
 
+# スパン（処理の段階ごとの所要時間）を書き出すJSONLファイルのパスを環境変数から取得します。
+# 空なら記録しません。終了時には段階ごとのp50/p95/p99をログに出します。
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+tracer = Tracer("host", TRACE_PATH)
+
 # --- 定数 ---
 # 使用するLLM（大規模言語モデル）のモデル名を定義します。
 MODEL_NAME = "gpt-4.1"
-# サーバー名とツール名を区切るための文字列を定義します。
-TOOL_SEPARATOR = "__"
+# ツール呼び出し1回あたりのタイムアウト（秒）を定義します。
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "60"))
+# 1つのMCPサーバーに同時に送るツール呼び出しの上限を定義します。
+DEFAULT_SERVER_CONCURRENCY = int(os.getenv("MCP_SERVER_CONCURRENCY", "4"))
+# MCPサーバーの起動（initializeとlist_toolsまで）を待つ時間の上限（秒）を定義します。
+MCP_STARTUP_TIMEOUT = float(os.getenv("MCP_STARTUP_TIMEOUT", "30"))
+# MCPサーバーを最初のツール呼び出しまで起動しない（遅延起動する）かどうかを定義します。
+MCP_LAZY_START = os.getenv("MCP_LAZY_START", "false").lower() in {"1", "true", "yes"}
+# ツールのマニフェストを保存するファイルを定義します。
+MANIFEST_CACHE_PATH = os.getenv(
+    "MCP_MANIFEST_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "tool_manifests.json"),
+)
+# この秒数より古いマニフェストは、バックグラウンドでサーバーに問い合わせて更新します。
+MANIFEST_MAX_AGE = float(os.getenv("MCP_MANIFEST_MAX_AGE", "86400"))
+# MCPサーバーにpingを送って生存を確認する間隔（秒、0なら定期的には確認しない）と、応答を待つ時間を定義します。
+MCP_HEALTH_INTERVAL = float(os.getenv("MCP_HEALTH_INTERVAL", "15"))
+MCP_HEALTH_TIMEOUT = float(os.getenv("MCP_HEALTH_TIMEOUT", "5"))
+# 再起動に失敗したときの待ち時間（最初の秒数と上限）を定義します。失敗するたびに倍になります。
+MCP_RESTART_BACKOFF = float(os.getenv("MCP_RESTART_BACKOFF", "0.5"))
+MCP_RESTART_BACKOFF_MAX = float(os.getenv("MCP_RESTART_BACKOFF_MAX", "30"))
+# 切り替え用の予備のプロセス（ウォームスタンバイ）を起動しておくかどうかを定義します。
+MCP_WARM_STANDBY = os.getenv("MCP_WARM_STANDBY", "false").lower() in {"1", "true", "yes"}
+# ツールの出力1件あたりと、1ターン（1回の応答のツール呼び出し全体）あたりの文字数の上限を定義します。
+# 上限を超えた出力は先頭と末尾だけを残し、途中を省略してLLMに渡します。
+TOOL_OUTPUT_MAX_CHARS = int(os.getenv("TOOL_OUTPUT_MAX_CHARS", "20000"))
+TOOL_OUTPUT_TURN_MAX_CHARS = int(os.getenv("TOOL_OUTPUT_TURN_MAX_CHARS", "60000"))
+# ツールの実行結果のキャッシュの設定を定義します。
+# 有効期限（秒、0ならキャッシュしない）、1件あたりの上限バイト数、全体の上限バイト数です。
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "300"))
+TOOL_CACHE_ENTRY_MAX_BYTES = int(os.getenv("TOOL_CACHE_ENTRY_MAX_BYTES", "1000000"))
+TOOL_CACHE_MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", "64000000"))
+# 複数のレプリカへの呼び出しの振り分け方（least_outstanding または round_robin）を定義します。
+MCP_LOAD_BALANCE = os.getenv("MCP_LOAD_BALANCE", LEAST_OUTSTANDING)
 
 # --- MCPサーバー設定 ---
 # MCPサーバーの設定を辞書形式で定義します。
@@ -68,6 +145,8 @@ RAW_CONFIG: Dict[str, dict] = {
             "server_google_search.py" # 実行するPythonスクリプト
         ], # ご自身の環境に合わせて修正（ここは特に重要です！）
     },
+    # streamable-httpで起動済みのサーバーに接続する場合は、commandの代わりにurlを指定します。
+    # "google_search": {"url": "http://127.0.0.1:8000/mcp"},
 }
 
 
@@ -77,63 +156,212 @@ class MCPServer(BaseModel):
     """単一のMCPサーバーインスタンスの定義。"""
 
     name: str # サーバーの名前
-    command: str # サーバーを起動するためのコマンド
-    args: List[str] # コマンドに渡す引数のリスト
+    command: Optional[str] = None # サーバーを起動するためのコマンド（urlを指定しない場合は必須）
+    args: List[str] = [] # コマンドに渡す引数のリスト
     env: Optional[Dict[str, str]] = None # サーバーに渡す環境変数（オプション）
-    session: Any = None # MCPクライアントセッションオブジェクト（実行時に設定されます）
+    url: Optional[str] = None # 起動済みのサーバーにStreamable HTTPで接続する場合のURL（オプション）
+    headers: Optional[Dict[str, str]] = None # HTTPで接続するときに送るヘッダー（オプション）
+    max_concurrency: int = DEFAULT_SERVER_CONCURRENCY # 1つのプロセスで同時に実行するツール呼び出しの上限（オプション）
+    call_timeout: float = TOOL_CALL_TIMEOUT # ツール呼び出し1回あたりのタイムアウト秒数（オプション）
+    startup_timeout: float = MCP_STARTUP_TIMEOUT # 起動を待つ時間の上限秒数（オプション）
+    lazy: bool = MCP_LAZY_START # 最初のツール呼び出しまで起動を遅らせるかどうか（オプション）
+    version: Optional[str] = None # マニフェストのキャッシュに使うパッケージのバージョン（オプション）
+    health_interval: float = MCP_HEALTH_INTERVAL # pingで生存を確認する間隔の秒数（オプション）
+    warm_standby: bool = MCP_WARM_STANDBY # 予備のプロセスを起動しておくかどうか（オプション）
+    replicas: int = 1 # 起動するプロセス（レプリカ）の数（オプション）
+    load_balance: str = MCP_LOAD_BALANCE # レプリカへの呼び出しの振り分け方（オプション）
+    output_limit: int = TOOL_OUTPUT_MAX_CHARS # ツールの出力1件あたりの文字数の上限（オプション）
+    output_limits: Dict[str, int] = {} # ツール名ごとの出力の文字数の上限（オプション）
+    cache_ttl: float = TOOL_CACHE_TTL # ツールの実行結果をキャッシュする秒数（オプション）
+    cache_policies: Dict[str, CachePolicy] = {} # ツール名ごとのキャッシュの方針（オプション）
+    pool: Any = None # レプリカをまとめて監視・振り分けるプール（実行時に設定されます）
+    start_lock: Any = None # 遅延起動が重複しないようにするロック（実行時に設定されます）
+
+    @model_validator(mode="after")
+    def check_command_or_url(self) -> "MCPServer":
+        # commandとurlのどちらか一方だけを指定します。
+        if (self.command is None) == (self.url is None):
+            raise ValueError(f"MCPサーバー '{self.name}' にはcommandかurlのどちらか一方を指定してください")
+        return self
+
+    def connect(self) -> Any:
+        """サーバーへの接続を開く非同期コンテキストマネージャを返す。
+        urlがあればStreamable HTTPで接続し、なければcommandをサブプロセスとして起動します。
+        """
+        if self.url is not None:
+            return streamablehttp_client(self.url, headers=self.headers)
+        return stdio_client(
+            StdioServerParameters(command=self.command, args=self.args, env=self.env)
+        )
 
+    def tool_manifest_key(self) -> str:
+        """ツールのマニフェストを保存するときのキー。"""
+        return manifest_key(self.url or self.command, self.args, self.version)
 
-def mcp_tool_to_openai_tool(tool: Tool, server_name: str) -> dict:
-    """MCPのToolオブジェクトをOpenAIのFunction Callingスキーマに変換する。
-    LLMがMCPツールを呼び出せるように、OpenAIが理解できる形式に変換します。
+    def cache_policy(self, tool: Tool) -> CachePolicy:
+        """ツールの実行結果をキャッシュする方針を返す。"""
+        default = CachePolicy(ttl=self.cache_ttl, max_bytes=TOOL_CACHE_ENTRY_MAX_BYTES)
+        return resolve_policy(tool, self.cache_policies.get(tool.name), default)
+
+
+async def start_server(
+    server: MCPServer, on_tools_changed: Optional[Callable[[List[Tool]], Any]] = None
+) -> List[Tool]:
+    """MCPサーバーのレプリカ（既定では1つ）をスーパーバイザーの下で起動し、ツールの一覧を返す。
+    起動後はスーパーバイザーが定期的に生存を確認し、異常があれば自動で再起動します。
+    全てのレプリカが起動時間の上限を超えた場合はasyncio.TimeoutErrorを送出します。
     """
-    # サーバー名とツール名を組み合わせて、OpenAIが認識する一意なツール名を生成します。
-    unique_name = f"{server_name}{TOOL_SEPARATOR}{tool.name}"
-    return {
-        "type": "function",
-        "name": unique_name, # OpenAIに渡すツール名
-        "description": tool.description, # ツールの説明（LLMがいつ使うべきかを判断するのに役立ちます）
-        "parameters": tool.inputSchema, # ツールの入力パラメータのスキーマ
-    }
 
+    def make_supervisor(index: int) -> ServerSupervisor:
+        # レプリカが複数ある場合は、ログで区別できるように番号を付けます。
+        name = server.name if server.replicas <= 1 else f"{server.name}#{index}"
+        return ServerSupervisor(
+            name,
+            server.connect,
+            startup_timeout=server.startup_timeout,
+            health_interval=server.health_interval,
+            health_timeout=MCP_HEALTH_TIMEOUT,
+            warm_standby=server.warm_standby,
+            backoff=MCP_RESTART_BACKOFF,
+            backoff_max=MCP_RESTART_BACKOFF_MAX,
+            on_tools_changed=on_tools_changed,
+            tracer=tracer,
+        )
 
-async def init_servers(
-    stack: AsyncExitStack, servers: Dict[str, MCPServer]
-) -> List[dict]:
-    """初期化部：設定された全MCPサーバーを起動し、利用可能なツールを収集する。
-    この関数は、MCPサーバーを起動し、それぞれのサーバーが提供するツールをOpenAI形式に変換して返します。
+    pool = ReplicaPool(
+        server.name,
+        make_supervisor,
+        replicas=server.replicas,
+        max_concurrency=server.max_concurrency,
+        policy=server.load_balance,
+    )
+    tools = await pool.start()
+    server.pool = pool
+    return tools
+
+
+async def stop_server(server: MCPServer) -> None:
+    """起動しているMCPサーバーの監視を止め、セッションが閉じるのを待つ。
+    停止する前に、レプリカごとの呼び出し数と所要時間をログに出力します。
     """
-    openai_tools: List[dict] = [] # OpenAI形式のツールを格納するリスト
+    if server.pool is None:
+        return
+    pool, server.pool = server.pool, None
+    for stats in pool.stats():
+        logger.info(f"[{server.name}] replica stats: {stats}")
+    await pool.stop()
 
-    # 設定された各サーバーについて処理を行います。
-    for server in servers.values():
-        try:
-            # MCPクライアントを起動し、標準入出力ストリーム（read, write）を取得します。
-            # AsyncExitStackを使って、サーバーの起動と停止を適切に管理します。
-            read, write = await stack.enter_async_context(
-                stdio_client(
-                    StdioServerParameters(
-                        command=server.command, args=server.args, env=server.env
-                    )
-                )
-            )
-            # 取得したストリームを使ってMCPクライアントセッションを作成します。
-            server.session = await stack.enter_async_context(ClientSession(read, write))
 
-            # MCPセッションを初期化します。
-            await server.session.initialize()
-            # サーバーが提供するツールのリストを取得します。
-            response = await server.session.list_tools()
+def tools_changed_handler(
+    server: MCPServer, registry: ToolRegistry, manifests: Optional[ToolManifestCache]
+) -> Callable[[List[Tool]], None]:
+    """再起動などでサーバーのツールが変わったときに、レジストリとマニフェストを更新する関数を返す。"""
 
-            # ログに利用可能なツール名を出力します。
-            logger.info(
-                f"[{server.name}] available tools → {[t.name for t in response.tools]}"
-            )
+    def handle(tools: List[Tool]) -> None:
+        logger.info(f"[{server.name}] tools changed → {[t.name for t in tools]}")
+        registry.register(server, tools)
+        if manifests is not None:
+            manifests.put(server.tool_manifest_key(), server.name, tools)
+
+    return handle
 
-            # 取得したMCPツールをOpenAI形式に変換し、リストに追加します。
-            for t in response.tools:
-                openai_tools.append(mcp_tool_to_openai_tool(t, server.name))
 
+async def fetch_tools(server: MCPServer) -> List[Tool]:
+    """MCPサーバーを一時的に起動してツールの一覧を取得し、すぐに停止する。
+    マニフェストの再検証に使います（チャットで使うセッションとは別のプロセスです）。
+    """
+    async with server.connect() as streams:
+        async with ClientSession(streams[0], streams[1]) as session:
+            await session.initialize()
+            response = await session.list_tools()
+            return response.tools
+
+
+async def ensure_pool(
+    server: MCPServer,
+    registry: ToolRegistry,
+    manifests: Optional[ToolManifestCache] = None,
+) -> Optional[ReplicaPool]:
+    """MCPサーバーのレプリカのプールを返す（起動していなければNone）。
+    遅延起動のサーバーで未起動なら、ここで起動します。
+    """
+    if server.pool is None and server.lazy:
+        # 同時に複数のツール呼び出しが来ても、起動は1回だけ行います。
+        if server.start_lock is None:
+            server.start_lock = asyncio.Lock()
+        async with server.start_lock:
+            if server.pool is None:
+                logger.info(f"[{server.name}] starting on first use")
+                handler = tools_changed_handler(server, registry, manifests)
+                tools = await start_server(server, handler)
+                # 起動したついでに、保存されているマニフェストを最新の内容に更新します。
+                # 内容が変わっていれば、レジストリもマニフェストの古いツールから入れ替えます。
+                if manifests is not None:
+                    if manifests.put(server.tool_manifest_key(), server.name, tools):
+                        registry.register(server, tools)
+                        logger.info(f"[{server.name}] tool manifest changed → {[t.name for t in tools]}")
+    return server.pool
+
+
+async def revalidate_manifest(
+    server: MCPServer, manifests: ToolManifestCache, registry: ToolRegistry
+) -> None:
+    """古くなったマニフェストをバックグラウンドでサーバーに問い合わせて更新する。
+    ツールの内容が変わっていれば、レジストリ（LLMに渡すツールの一覧）もその場で更新します。
+    """
+    try:
+        tools = await asyncio.wait_for(fetch_tools(server), timeout=server.startup_timeout)
+    except Exception as e:
+        logger.warning(f"[{server.name}] manifest revalidation failed: {e!r}")
+        return
+    key = server.tool_manifest_key()
+    if manifests.put(key, server.name, tools):
+        registry.register(server, tools)
+        logger.info(f"[{server.name}] tool manifest changed → {[t.name for t in tools]}")
+
+
+async def init_servers(
+    stack: AsyncExitStack,
+    servers: Dict[str, MCPServer],
+    manifests: Optional[ToolManifestCache] = None,
+) -> ToolRegistry:
+    """初期化部：設定された全MCPサーバーを起動し、利用可能なツールを収集する。
+    この関数は、MCPサーバーを起動し、それぞれのサーバーが提供するツールをレジストリに登録して返します。
+    レジストリのopenai_toolsが、OpenAI形式に変換したツールの一覧です。
+    全てのサーバーは同時に起動し、起動時間の上限を超えたサーバーや起動に失敗したサーバーは
+    理由をログに残して読み飛ばします。
+    遅延起動（lazy）のサーバーは、保存されたマニフェストがあれば起動せずにそのツールを返し、
+    最初のツール呼び出しのときに起動します。
+    """
+    background: List[asyncio.Task] = [] # マニフェストの再検証を行うタスク
+    registry = ToolRegistry()
+
+    async def shutdown() -> None:
+        # 再検証を中止し、起動している全サーバーに終了を知らせてセッションが閉じるのを待ちます。
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await asyncio.gather(*(stop_server(server) for server in servers.values()))
+
+    # AsyncExitStackに終了処理を登録し、チャットループ終了時にサーバーを停止します。
+    stack.push_async_callback(shutdown)
+
+    async def init_one(server: MCPServer) -> List[Tool]:
+        """1つのサーバーを起動（または保存済みのマニフェストを読み込み）し、ツールの一覧を返す。"""
+        key = server.tool_manifest_key()
+        if server.lazy and manifests is not None:
+            cached = manifests.get(key)
+            if cached is not None:
+                logger.info(f"[{server.name}] using cached tool manifest (not started)")
+                return cached
+        try:
+            tools = await start_server(server, tools_changed_handler(server, registry, manifests))
+        except asyncio.TimeoutError:
+            # 起動が間に合わなかったサーバーは読み飛ばします。
+            logger.error(
+                f"[{server.name}] skipped: not ready within {server.startup_timeout} seconds"
+            )
+            return []
         # --- 3.4節 パターンBのエラー処理 ---
         # MCPサーバーでエラーが発生した場合の処理
         except McpError as e:
@@ -141,42 +369,420 @@ async def init_servers(
             logger.error(
                 f"MCP Error on server '{server.name}': {e.error.message} (Code: {e.error.code})"
             )
+            return []
+        except Exception as e:
+            # コマンドが見つからない、起動直後に終了したなどの場合も読み飛ばします。
+            logger.error(f"[{server.name}] skipped: failed to start ({e!r})")
+            return []
+        if manifests is not None:
+            manifests.put(key, server.name, tools)
+        return tools
+
+    # 全サーバーの起動を並行して待ちます（結果は設定の順番のまま）。
+    results = await asyncio.gather(*(init_one(server) for server in servers.values()))
+
+    for server, tools in zip(servers.values(), results):
+        # ログに利用可能なツール名を出力します。
+        logger.info(f"[{server.name}] available tools → {[t.name for t in tools]}")
+        # 取得したMCPツールをOpenAI形式に変換し、レジストリに登録します。
+        registry.register(server, tools)
+
+    # 起動していない遅延起動サーバーのうち、マニフェストが古いものはバックグラウンドで再検証します。
+    if manifests is not None:
+        for server in servers.values():
+            key = server.tool_manifest_key()
+            if server.lazy and server.pool is None and manifests.is_stale(key):
+                background.append(
+                    asyncio.create_task(revalidate_manifest(server, manifests, registry))
+                )
 
-    return openai_tools
+    return registry
+
+
+async def call_tool(session: ClientSession, name: str, args: dict) -> CallToolResult:
+    """MCPツールを呼び出す。トレース中であれば、_metaにtraceparentを付けて
+    MCPサーバー側の処理も同じtrace_idで記録できるようにします。
+    """
+    traceparent = tracer.traceparent()
+    if traceparent is None:
+        return await session.call_tool(name=name, arguments=args)
+    # ClientSession.call_toolは_metaを受け取らないため、リクエストを直接組み立てて送ります。
+    request = CallToolRequest(
+        method="tools/call",
+        params=CallToolRequestParams(
+            name=name, arguments=args, _meta=RequestParams.Meta(traceparent=traceparent)
+        ),
+    )
+    return await session.send_request(ClientRequest(request), CallToolResult)
 
 
 async def dispatch_tool_call(
-    tool_call: ResponseFunctionToolCall, servers: Dict[str, MCPServer]
-) -> str:
+    tool_call: ResponseFunctionToolCall,
+    registry: ToolRegistry,
+    manifests: Optional[ToolManifestCache] = None,
+    cache: Optional[ToolResultCache] = None,
+) -> ToolOutput:
     """LLMのツール呼び出し指示を解釈し、対応するMCPツールを実行する。
     LLMが特定のツールを呼び出すように指示した場合、この関数がそのツールを実際に実行します。
+    引数がツールのスキーマに合わない場合は、MCPサーバーに送らずにToolArgumentErrorを送出します。
+    結果は全てのコンテンツ（テキスト・画像・リソース）を、ツールごとの文字数の上限に収めて返します。
+    同じ引数での呼び出しの結果がキャッシュにあれば、MCPサーバーを呼ばずにそれを返します。
     """
-    # LLMから渡された引数をJSON形式からPythonの辞書に変換します。
-    args = json.loads(tool_call.arguments)
-    # ツール名からサーバー名と実際のツール名を分離します。
-    server_name, tool_name = tool_call.name.split(TOOL_SEPARATOR)
-    # 対応するサーバーのセッションを取得します。
-    session = servers[server_name].session
-
-    # ログにどのツールが呼び出されているかを出力します。
-    logger.info(f"Calling tool '{tool_name}' on server '{server_name}'")
-    # MCPツールを呼び出し、その結果を取得します。
-    result = await session.call_tool(name=tool_name, arguments=args)
+    # ツール名から呼び出し先のサーバーとツールをレジストリで引きます。
+    entry = registry.lookup(tool_call.name)
+    server, tool_name = entry.server, entry.tool.name
+    # LLMから渡された引数をJSON形式からPythonの辞書に変換し、スキーマで検証します。
+    try:
+        args = json.loads(tool_call.arguments or "{}")
+    except json.JSONDecodeError as e:
+        raise ToolArgumentError(f"ツール '{tool_name}' の引数がJSONとして読めません: {e}") from None
+    entry.validate(args)
+    # キャッシュしてよいツールであれば、有効期限内の結果を探します。
+    policy = server.cache_policy(entry.tool)
+    key = cache_key(server.name, tool_name, args)
+    # bypass_cache=trueの呼び出しはキャッシュから返さず、結果も保存しません。
+    if requests_bypass(args):
+        cache = None
+    if cache is not None and policy.cacheable:
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"Tool '{tool_name}' served from cache.")
+            if tracer.current is not None:
+                tracer.current.set(cache_hit=True)
+            return cached
+    # 遅延起動のサーバーであればここで起動します。
+    pool = await ensure_pool(server, registry, manifests)
+    # 起動に失敗したなどで起動していないサーバーは呼び出せません。
+    if pool is None:
+        raise RuntimeError(f"MCPサーバー '{server.name}' は起動していません")
+
+    # 呼び出しを送るレプリカを選びます。再起動中なら起動時間の上限まで復旧を待ち、
+    # 同時実行数の上限に達している場合は、空きが出るまで待ちます。
+    async with pool.acquire(server.startup_timeout) as (replica, session):
+        # ログにどのツールが呼び出されているかを出力します。
+        logger.info(
+            f"Calling tool '{tool_name}' on server '{server.name}' (replica {replica.index})"
+        )
+        # MCPツールを呼び出し、その結果を取得します。タイムアウトを超えたら打ち切ります。
+        try:
+            with tracer.span(
+                "mcp.call_tool", server=server.name, tool=tool_name, replica=replica.index
+            ):
+                # 呼び出し中にプロセスが終了したら、タイムアウトを待たずにすぐ失敗させます。
+                result = await asyncio.wait_for(
+                    replica.supervisor.guard(session, call_tool(session, tool_name, args)),
+                    timeout=server.call_timeout,
+                )
+        except Exception as e:
+            # 接続が切れた場合だけ、スーパーバイザーにすぐ生存確認をさせます。
+            # ツールが遅いだけのタイムアウトでは、他の呼び出しを止めないようにそのまま失敗させます。
+            if is_transport_error(e):
+                replica.supervisor.report_failure(session)
+            raise
+
+    # ツールの出力の文字数の上限（ツールごとの指定がなければサーバーごとの指定）を決めます。
+    limit = server.output_limits.get(tool_name, server.output_limit)
 
     # ツール実行結果がエラーだった場合
     if result.isError:
         # エラーメッセージを取得します。
-        error_content = (
-            result.content[0].text if result.content else "Unknown tool error"
-        )
+        if not result.content:
+            return ToolOutput.from_text("Tool Error: Unknown tool error", limit)
+        output = render_contents(result.content, limit, prefix="Tool Error: ")
         # 警告ログを出力し、エラーメッセージを返します。
-        logger.warning(f"Tool '{tool_name}' returned an error: {error_content}")
-        return f"Tool Error: {error_content}"
+        logger.warning(f"Tool '{tool_name}' returned an error: {output.render(200)}")
+        return output
 
     # ツールが正常に実行された場合
     logger.info(f"Tool '{tool_name}' executed successfully.")
-    # ツールの実行結果を文字列として返します。
-    return str(result.content[0].text)
+    # 全てのコンテンツを順番に書き込み、上限を超えた分は途中を省略します。
+    output = render_contents(result.content, limit)
+    if output.truncated:
+        logger.info(f"Tool '{tool_name}' output truncated: {output.total} → {limit} chars")
+    # エラーでなかった結果だけを保存します。
+    if cache is not None:
+        cache.put(key, output, policy)
+    return output
+
+
+async def execute_tool_call(
+    tool_call: ResponseFunctionToolCall,
+    registry: ToolRegistry,
+    manifests: Optional[ToolManifestCache] = None,
+    cache: Optional[ToolResultCache] = None,
+) -> ToolOutput:
+    """ツール呼び出しを1件実行し、その出力を返す。
+    タイムアウトや例外が発生しても、そのツールの「Tool Error」出力として返すため、
+    他のツール呼び出しには影響しません。
+    """
+    try:
+        with tracer.span("tool_call", tool=tool_call.name, call_id=tool_call.call_id):
+            return await dispatch_tool_call(tool_call, registry, manifests, cache)
+    except (ToolArgumentError, UnknownToolError) as e:
+        # 引数やツール名の誤りはLLMが直せるように、理由をそのままツールの出力として返します。
+        logger.warning(f"Tool '{tool_call.name}' rejected: {e}")
+        output = f"Tool Error: {e}"
+    except asyncio.TimeoutError:
+        # タイムアウトした場合は、その旨をツールの出力として返します。
+        logger.warning(f"Tool '{tool_call.name}' timed out.")
+        output = "Tool Error: ツールの実行がタイムアウトしました"
+    except Exception as e:
+        # その他の例外（サーバーの異常終了や引数の不正など）もツールの出力として返します。
+        logger.exception(f"Tool '{tool_call.name}' failed.")
+        output = f"Tool Error: {e}"
+    return ToolOutput.from_text(output, TOOL_OUTPUT_MAX_CHARS)
+
+
+def function_call_output(tool_call: ResponseFunctionToolCall, output: str) -> dict:
+    """ツールの出力を、OpenAIに渡すfunction_call_output形式にする。"""
+    return {
+        "type": "function_call_output",
+        "call_id": tool_call.call_id,
+        "output": output,
+    }
+
+
+async def run_tool_call(
+    tool_call: ResponseFunctionToolCall,
+    registry: ToolRegistry,
+    manifests: Optional[ToolManifestCache] = None,
+    cache: Optional[ToolResultCache] = None,
+) -> dict:
+    """ツール呼び出しを1件実行し、OpenAIに渡すfunction_call_output形式で返す。"""
+    output = await execute_tool_call(tool_call, registry, manifests, cache)
+    return function_call_output(tool_call, output.render())
+
+
+def function_call_outputs(
+    tool_calls: List[ResponseFunctionToolCall], outputs: List[ToolOutput]
+) -> List[dict]:
+    """1回の応答のツールの出力を、OpenAIに渡すfunction_call_output形式のリストにする。
+    出力の合計が1ターンあたりの上限を超える場合は、小さい出力はそのまま残し、
+    大きい出力を均等に切り詰めて上限に収めます。
+    """
+    rendered = fit_to_budget(list(outputs), TOOL_OUTPUT_TURN_MAX_CHARS)
+    return [function_call_output(call, text) for call, text in zip(tool_calls, rendered)]
+
+
+async def run_tool_calls(
+    tool_calls: List[ResponseFunctionToolCall],
+    registry: ToolRegistry,
+    manifests: Optional[ToolManifestCache] = None,
+    cache: Optional[ToolResultCache] = None,
+) -> List[dict]:
+    """複数のツール呼び出しを並行して実行する。
+    結果は呼び出しの順番（call_idの順）のまま返します。
+    """
+    outputs = await asyncio.gather(
+        *(execute_tool_call(call, registry, manifests, cache) for call in tool_calls)
+    )
+    return function_call_outputs(tool_calls, outputs)
+
+
+def build_openai_client() -> AsyncOpenAI:
+    """タイムアウトと接続プールを設定した非同期OpenAIクライアントを作成する。
+    非同期クライアントを使うことで、モデルの応答を待っている間もMCPサーバーとの通信が止まりません。
+    """
+    return AsyncOpenAI(
+        api_key=API_KEY,
+        # 全体のタイムアウトと、接続確立までのタイムアウトを設定します。
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        # 接続プールを設定し、リクエストごとにTLS接続を作り直さないようにします。
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            )
+        ),
+    )
+
+
+async def create_response(client: AsyncOpenAI, **kwargs: Any) -> Response:
+    """responses.createを呼び出し、かかった時間をスパンとして記録する。"""
+    with tracer.span("openai.responses.create", model=kwargs.get("model")) as span:
+        response: Response = await client.responses.create(**kwargs)
+        if span is not None:
+            span.set(response_id=response.id)
+        return response
+
+
+async def stream_response(
+    client: AsyncOpenAI,
+    registry: ToolRegistry,
+    manifests: Optional[ToolManifestCache] = None,
+    cache: Optional[ToolResultCache] = None,
+    on_text: Optional[Callable[[str], Any]] = None,
+    **kwargs: Any,
+) -> Tuple[Response, List[dict]]:
+    """LLMの応答をストリーミングで受け取り、応答とツールの出力を返す。
+    回答の文字列は届いた順にon_textに渡し、function_callは引数がそろった時点で
+    （応答の残りを待たずに）実行を始めるため、ツールの実行とLLMの生成が重なります。
+    """
+    tool_calls: List[ResponseFunctionToolCall] = []
+    tasks: List[asyncio.Task] = []
+    response: Optional[Response] = None
+    with tracer.span("openai.responses.create", model=kwargs.get("model"), stream=True) as span:
+        started = time.monotonic()
+        first_output: Optional[float] = None
+        try:
+            stream = await client.responses.create(stream=True, **kwargs)
+            async with stream:
+                async for event in stream:
+                    if event.type == "response.output_text.delta":
+                        first_output = first_output or time.monotonic()
+                        if on_text is not None:
+                            on_text(event.delta)
+                    elif event.type == "response.output_item.done" and event.item.type == "function_call":
+                        # 引数がそろったツール呼び出しは、すぐに実行を始めます。
+                        first_output = first_output or time.monotonic()
+                        tool_calls.append(event.item)
+                        tasks.append(
+                            asyncio.create_task(
+                                execute_tool_call(event.item, registry, manifests, cache)
+                            )
+                        )
+                    elif event.type in ("response.completed", "response.incomplete"):
+                        response = event.response
+                    elif event.type == "response.failed":
+                        error = event.response.error
+                        raise RuntimeError(f"Responses API failed: {error.message if error else 'unknown'}")
+                    elif event.type == "error":
+                        raise RuntimeError(f"Responses API error: {event.message}")
+            if response is None:
+                raise RuntimeError("Responses API stream ended without a response")
+        except BaseException:
+            # 応答を受け取れなかった場合は、実行を始めたツール呼び出しも取りやめます。
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        if span is not None:
+            span.set(response_id=response.id, tool_calls=len(tool_calls))
+            if first_output is not None:
+                span.set(first_output_ms=round((first_output - started) * 1000, 1))
+    outputs = await asyncio.gather(*tasks)
+    return response, function_call_outputs(tool_calls, outputs)
+
+
+async def run_turn(
+    client: AsyncOpenAI,
+    user_text: str,
+    previous_id: Optional[str],
+    registry: ToolRegistry,
+    manifests: Optional[ToolManifestCache] = None,
+    cache: Optional[ToolResultCache] = None,
+    on_text: Optional[Callable[[str], Any]] = None,
+) -> Response:
+    """ユーザーの発言1つに対して、LLMの呼び出しとツールの実行を繰り返し、最終的な応答を返す。
+    ストリーミングの場合は、回答の文字列を届いた順にon_textに渡します。
+    """
+    # LLMに渡すための引数を準備します。
+    call_kwargs = {
+        "model": MODEL_NAME, # 使用するLLMのモデル名
+        "input": [{"role": "user", "content": user_text}], # ユーザーの入力メッセージ
+        "tools": registry.openai_tools, # LLMが利用できるツール群
+    }
+
+    # OpenAIのresponses APIではprevious_idでチャット履歴を管理できる
+    # 以前の応答IDがあれば、チャット履歴として渡します。
+    if previous_id:
+        call_kwargs["previous_response_id"] = previous_id
+
+    # LLMがツール呼び出しを行う場合、それらを処理して結果を再送信
+    # ツール呼び出しがある限りループを続けます。
+    # previous_idで管理するため以前の会話履歴にfunction_callがあったとしても
+    # 今回は今回のみのresponseにfunction_callがあるか確認できるようになっている。
+    while True:
+        if OPENAI_STREAM:
+            # ストリーミングで受け取り、ツール呼び出しは引数がそろった時点で実行します。
+            response, tool_outputs = await stream_response(
+                client, registry, manifests, cache, on_text, **call_kwargs
+            )
+        else:
+            # OpenAIにリクエストを送信し、LLMからの応答を取得します。
+            response = await create_response(client, **call_kwargs)
+            # LLMからの応答に含まれる出力項目のうち、function_callタイプのものを取り出します。
+            tool_calls = [
+                item for item in response.output if item.type == "function_call"
+            ]
+            # 全てのツール呼び出しを並行して実行し、OpenAIに渡す形式の結果を取得します。
+            tool_outputs = await run_tool_calls(tool_calls, registry, manifests, cache)
+        # LLMの応答をログに出力します。
+        logger.info(f"Model response: {response}")
+        if not tool_outputs:
+            return response
+
+        # ツール出力をログに出力します。
+        logger.info(f"Submitting tool outputs: {len(tool_outputs)}")
+        # ツール実行結果をLLMに再送信し、次の応答を取得します。
+        call_kwargs = {
+            "model": MODEL_NAME,
+            "previous_response_id": response.id,
+            "input": tool_outputs,
+            "tools": registry.openai_tools,
+        }
+
+
+@dataclass
+class Agent:
+    """対話に使うOpenAIクライアント・ツールのレジストリ・キャッシュをまとめたもの。
+    chat_loopと、複数の会話を同時に実行するagent_runner.pyで共有します。
+    """
+
+    client: AsyncOpenAI
+    registry: ToolRegistry
+    manifests: ToolManifestCache
+    cache: ToolResultCache
+
+    async def run_turn(
+        self,
+        user_text: str,
+        previous_id: Optional[str],
+        on_text: Optional[Callable[[str], Any]] = None,
+    ) -> Response:
+        """ユーザーの発言1つに対する最終的な応答を返す。"""
+        return await run_turn(
+            self.client, user_text, previous_id, self.registry, self.manifests, self.cache, on_text
+        )
+
+
+async def open_agent(stack: AsyncExitStack, servers: Dict[str, MCPServer]) -> Agent:
+    """OpenAIクライアントとMCPサーバーを準備する。
+    終了処理（サーバーの停止・接続プールのクローズ・統計のログ出力）はstackに登録します。
+    """
+    # 非同期OpenAIクライアントを初期化します。終了時には接続プールも閉じられます。
+    client = await stack.enter_async_context(build_openai_client())
+    # ツールのマニフェストを保存するキャッシュを用意します（遅延起動で使います）。
+    manifests = ToolManifestCache(MANIFEST_CACHE_PATH, MANIFEST_MAX_AGE)
+    # MCPサーバーを初期化し、利用可能なツールをレジストリに登録します。
+    registry = await init_servers(stack, servers, manifests)
+    # ツールの実行結果のキャッシュを用意します。終了時にヒット率をログに出します。
+    cache = ToolResultCache(TOOL_CACHE_MAX_BYTES)
+    stack.callback(lambda: logger.info(f"Tool result cache: {cache.stats()}"))
+    # 終了時に段階ごとの所要時間をログに出し、トレースのファイルを閉じます。
+    if tracer.enabled:
+        stack.callback(tracer.close)
+        stack.callback(lambda: logger.info(f"Latency summary:\n{tracer.format_summary()}"))
+    return Agent(client, registry, manifests, cache)
+
+
+class AnswerPrinter:
+    """LLMの回答を表示する。ストリーミングの場合は、届いた文字列をそのまま続けて表示します。"""
+
+    def __init__(self) -> None:
+        self.started = False
+
+    def __call__(self, delta: str) -> None:
+        if not self.started:
+            print("Assistant: ", end="")
+            self.started = True
+        print(delta, end="", flush=True)
+
+    def finish(self, response: Response) -> None:
+        # ストリーミングで何も届かなかった場合は、応答の全体を表示します。
+        if not self.started:
+            print(f"Assistant: {response.output_text}", end="")
+        print("\n")
 
 
 async def chat_loop(servers: Dict[str, MCPServer]) -> None:
@@ -184,15 +790,14 @@ async def chat_loop(servers: Dict[str, MCPServer]) -> None:
     この関数は、ユーザーからの入力を受け取り、LLMに渡して応答を生成し、
     必要に応じてMCPツールを呼び出す一連の処理を管理します。
     """
-    # OpenAIクライアントを初期化します。APIキーを使ってOpenAIサービスと通信します。
-    client = OpenAI(api_key=API_KEY)
-
     # AsyncExitStackを使って、サーバーのライフサイクル（起動・停止）を管理します。
     async with AsyncExitStack() as stack:
-        # MCPサーバーを初期化し、利用可能なツールをOpenAI形式で取得します。
-        tools = await init_servers(stack, servers)
+        # OpenAIクライアントとMCPサーバーを準備します。
+        agent = await open_agent(stack, servers)
         # 以前の応答IDを保持するための変数。チャット履歴を管理するために使います。
         previous_id: Optional[str] = None
+        # 何ターン目かを数えます（トレースの属性に使います）。
+        turn = 0
 
         # 無限ループでユーザーとの対話を続けます。
         while True:
@@ -202,65 +807,17 @@ async def chat_loop(servers: Dict[str, MCPServer]) -> None:
             if user_text.strip().lower() in {"exit", "quit"}:
                 break
             
-            # LLMに渡すための引数を準備します。
-            call_kwargs = {
-                "model": MODEL_NAME, # 使用するLLMのモデル名
-                "input": [{"role": "user", "content": user_text}], # ユーザーの入力メッセージ
-                "tools": tools, # LLMが利用できるツール群
-            }
-
-            # OpenAIのresponses APIではprevious_idでチャット履歴を管理できる
-            # 以前の応答IDがあれば、チャット履歴として渡します。
-            if previous_id:
-                call_kwargs["previous_response_id"] = previous_id
-            
-            # 初期のリクエストを送信
-            # OpenAIに初期のリクエストを送信し、LLMからの応答を取得します。
-            response: Response = client.responses.create(**call_kwargs)
-
-            # LLMがツール呼び出しを行う場合、それらを処理して結果を再送信
-            # ツール呼び出しがある限りループを続けます。
-            # previous_idで管理するため以前の会話履歴にfunction_callがあったとしても
-            # 今回は今回のみのresponseにfunction_callがあるか確認できるようになっている。
-            while any(
-                (item.type == "function_call") for item in response.output
-            ):
-                # MCPツールを呼び出し、その出力を収集
-                # 複数のツール呼び出しに対応するため、ツール出力のリストを初期化します。
-                tool_outputs = []
-                # LLMからの応答に含まれる各出力項目を処理します。
-                for tool_call in response.output:
-                    # function_callタイプでなければスキップします。
-                    if tool_call.type != "function_call":
-                        continue
-                    
-                    # ツール呼び出しをディスパッチ（実行）し、その結果を取得します。
-                    tool_output = await dispatch_tool_call(tool_call, servers)
-                    # ツール実行結果をOpenAIに渡す形式でリストに追加します。
-                    tool_outputs.append(
-                        {
-                            "type": "function_call_output",
-                            "call_id": tool_call.call_id,
-                            "output": tool_output,
-                        }
-                    )
-
-                # ツール出力をログに出力します。
-                logger.info(f"Submitting tool outputs: {len(tool_outputs)}")
-                # ツール実行結果をLLMに再送信し、次の応答を取得します。
-                response = client.responses.create(
-                    model=MODEL_NAME,
-                    previous_response_id=response.id,
-                    input=tool_outputs,
-                    tools=tools,
-                )
-                # LLMの応答をログに出力します。
-                logger.info(f"Model response: {response}")
+            # 1ターン分（ユーザーの発言から最終的な応答まで）を1つのスパンとして記録します。
+            # ツール呼び出しやMCPサーバー側の処理も、同じtrace_idでたどれます。
+            turn += 1
+            # LLMからの回答をユーザーに表示します（ストリーミングでは届いた順に表示します）。
+            printer = AnswerPrinter()
+            with tracer.span("turn", turn=turn):
+                response = await agent.run_turn(user_text, previous_id, printer)
+            printer.finish(response)
 
             # 現在の応答IDを次のターンのために保存します。
             previous_id = response.id
-            # LLMからの最終的なテキスト応答をユーザーに表示します。
-            print(f"Assistant: {response.output_text}\n")
 
 
 def build_servers(raw: Dict[str, dict]) -> Dict[str, MCPServer]:
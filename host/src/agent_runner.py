@@ -0,0 +1,191 @@
+"""複数の会話を同時に実行するヘッドレスのランナー。
+
+chat_loopは1人のユーザーと対話するためのものなので、多数の会話をまとめて処理する場合はこちらを使う。
+MCPサーバーのセッションとOpenAIクライアントは全ての会話で共有し、
+会話ごとにprevious_response_idをつないで発言を順番に処理する。
+同時に実行する会話の数には上限があり、入力は処理が追いつく分だけ読み込む（バックプレッシャー）。
+結果は発言ごとに、終わった順にJSONLで書き出す。
+
+入力（JSONL、1行に1会話）:
+    {"id": "conv-1", "prompts": ["東京の天気は？", "明日はどうですか？"]}
+    {"id": "conv-2", "prompt": "MCPとは何ですか？"}
+出力（JSONL、1行に1発言）:
+    {"id": "conv-1", "turn": 1, "prompt": "...", "response_id": "...", "output": "...", "elapsed_ms": 812.3}
+    失敗した発言はoutputの代わりにerrorが入り、その会話の残りの発言は実行しない。
+    形式が正しくない入力の行は {"id": "<行番号>", "line": 3, "error": "..."} を書き出して読み飛ばす。
+
+実行方法:
+    uv run agent_runner.py prompts.jsonl -o results.jsonl --concurrency 8 [--config servers.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import AsyncExitStack
+from typing import Dict, Iterator, Optional, TextIO
+
+from agent_chat_with_google_search import RAW_CONFIG, Agent, build_servers, open_agent, tracer
+
+logger = logging.getLogger(__name__)
+
+# 同時に実行する会話の数の上限（OpenAIの接続プールの大きさ OPENAI_MAX_CONNECTIONS 以下にします）
+RUNNER_CONCURRENCY = int(os.getenv("AGENT_RUNNER_CONCURRENCY", "8"))
+
+
+def parse_conversation(line: str, number: int) -> dict:
+    """入力の1行を会話にする（idがなければ行番号を使う）。形式が違えばValueErrorかTypeErrorを送出する"""
+    conversation = json.loads(line)
+    if not isinstance(conversation, dict):
+        raise TypeError("会話はJSONのオブジェクトで指定してください")
+    prompts = conversation.get("prompts")
+    if prompts is None:
+        if "prompt" not in conversation:
+            raise ValueError("promptsかpromptを指定してください")
+        prompts = [conversation["prompt"]]
+    if not isinstance(prompts, list):
+        raise TypeError("promptsはリストで指定してください")
+    return {"id": conversation.get("id", str(number)), "prompts": prompts}
+
+
+def read_conversations(f: TextIO) -> Iterator[dict]:
+    """入力のJSONLから会話を1つずつ読み込む。
+    形式が正しくない行は実行を止めずにログに残し、代わりにerrorを入れた記録を返す。
+    """
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield parse_conversation(line, number)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Skipping malformed input at line {number}: {e}")
+            yield {"id": str(number), "line": number, "error": f"入力の{number}行目が不正です: {e}"}
+
+
+class ResultWriter:
+    """結果をJSONLで1行ずつ書き出し、件数を数える"""
+
+    def __init__(self, f: TextIO) -> None:
+        self.f = f
+        self.turns = 0
+        self.errors = 0
+
+    def write(self, record: dict) -> None:
+        self.turns += 1
+        if "error" in record:
+            self.errors += 1
+        self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+
+async def run_conversation(agent: Agent, conversation: dict, writer: ResultWriter) -> None:
+    """1つの会話の発言を、previous_response_idをつなぎながら順番に実行する"""
+    previous_id: Optional[str] = None
+    for turn, prompt in enumerate(conversation["prompts"], 1):
+        record = {"id": conversation["id"], "turn": turn, "prompt": prompt}
+        started = time.monotonic()
+        try:
+            with tracer.span("turn", conversation=conversation["id"], turn=turn):
+                response = await agent.run_turn(prompt, previous_id)
+        except Exception as e:
+            logger.exception(f"Conversation '{conversation['id']}' failed at turn {turn}.")
+            record.update(error=repr(e), elapsed_ms=round((time.monotonic() - started) * 1000, 1))
+            writer.write(record)
+            return
+        previous_id = response.id
+        record.update(
+            response_id=response.id,
+            output=response.output_text,
+            elapsed_ms=round((time.monotonic() - started) * 1000, 1),
+        )
+        writer.write(record)
+
+
+async def run_all(
+    conversations: Iterator[dict], writer: ResultWriter, concurrency: int, agent: Agent
+) -> int:
+    """会話を最大concurrency個ずつ同時に実行し、実行した会話の数を返す。
+    入力はキューに空きがある分だけ読み込むため、大きな入力でもメモリを使いすぎません。
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    count = 0
+
+    async def worker() -> None:
+        while True:
+            conversation = await queue.get()
+            if conversation is None:
+                return
+            await run_conversation(agent, conversation, writer)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        while True:
+            # 標準入力からの読み込みでイベントループを止めないように、別のスレッドで読みます。
+            conversation = await asyncio.to_thread(next, conversations, None)
+            if conversation is None:
+                break
+            if "error" in conversation:
+                # 読み込めなかった行は、実行せずにエラーとして書き出します。
+                writer.write(conversation)
+                continue
+            # キューがいっぱいなら、どれかの会話が終わるまで読み込みを待ちます。
+            await queue.put(conversation)
+            count += 1
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return count
+
+
+async def main_async(
+    input_file: TextIO, output_file: TextIO, concurrency: int, config: Dict[str, dict]
+) -> None:
+    async with AsyncExitStack() as stack:
+        # MCPサーバーとOpenAIクライアントは全ての会話で共有します。
+        agent = await open_agent(stack, build_servers(config))
+        writer = ResultWriter(output_file)
+        started = time.monotonic()
+        count = await run_all(read_conversations(input_file), writer, concurrency, agent)
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Finished {count} conversations / {writer.turns} turns "
+            f"({writer.errors} errors) in {elapsed:.1f} s "
+            f"({writer.turns / elapsed if elapsed else 0.0:.2f} turns/s)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="複数の会話を同時に実行するヘッドレスのランナー")
+    parser.add_argument("input", help="会話のJSONL（-なら標準入力）")
+    parser.add_argument("-o", "--output", default="-", help="結果のJSONL（-なら標準出力）")
+    parser.add_argument(
+        "--concurrency", type=int, default=RUNNER_CONCURRENCY, help="同時に実行する会話の数の上限"
+    )
+    parser.add_argument(
+        "--config", help="MCPサーバーの設定（RAW_CONFIGと同じ形式のJSON。省略時はRAW_CONFIG）"
+    )
+    args = parser.parse_args()
+
+    config = RAW_CONFIG
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        asyncio.run(main_async(input_file, output_file, max(args.concurrency, 1), config))
+    finally:
+        for f in (input_file, output_file):
+            if f not in (sys.stdin, sys.stdout):
+                f.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""chat_loopのオフラインベンチマーク。
+
+OpenAI Responses APIの代替サーバー（fake_responses_api.py）と
+Custom Search APIの代替サーバー（servers/src/fake_search_backend.py）をローカルで起動し、
+記録した会話（bench_conversations.jsonl）の発言を標準入力の代わりにchat_loopへ流し込む。
+google_searchサーバーは通常どおりstdioで起動するため、ホストのツール呼び出しから
+MCPサーバー・検索APIの呼び出しまでを、ネットワークなしで一通り計測できる。
+
+所要時間はtracing.pyのスパン（TRACE_PATH）から集計し、
+ターン/秒・ツール呼び出し/秒と、段階ごとのp50/p95/p99を表示する。
+
+実行方法:
+    uv run bench_chat_loop.py --repeat 5 --llm-latency 0.2 --llm-interval 0.02 --search-latency 0.1
+    uv run bench_chat_loop.py --no-stream ...  # ストリーミングを使わない場合と比べる
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_responses_api import FakeResponsesAPI, load_conversations
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVERS_DIR = os.path.normpath(os.path.join(HERE, "..", "..", "servers", "src"))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_search_backend(port: int, latency: float) -> subprocess.Popen:
+    """Custom Search APIの代替サーバーを別プロセスで起動し、接続できるまで待つ"""
+    script = os.path.join(SERVERS_DIR, "fake_search_backend.py")
+    proc = subprocess.Popen(
+        [sys.executable, script, "--port", str(port), "--latency", str(latency)],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc
+        except OSError:
+            if time.monotonic() > deadline:
+                proc.terminate()
+                raise
+            time.sleep(0.05)
+
+
+def search_server_config(backend_url: str, server_python: str | None) -> dict:
+    """代替サーバーを検索APIとして使うgoogle_searchサーバーの設定"""
+    if server_python:
+        command, args = server_python, [os.path.join(SERVERS_DIR, "server_google_search.py")]
+    else:
+        command, args = "uv", ["--directory", SERVERS_DIR, "run", "server_google_search.py"]
+    env = {
+        "GOOGLE_CSE_API_KEY": "dummy-key",
+        "GOOGLE_CSE_ID": "dummy-cx",
+        "GOOGLE_CSE_ENDPOINT": backend_url,
+        "GOOGLE_SEARCH_CACHE_PATH": "",  # メモリ層のみ（前回の結果を使わない）
+        "GOOGLE_SEARCH_QUOTA_PATH": "",
+        "GOOGLE_SEARCH_RATE": "0",  # ベンチマークではレート制限をかけない
+        "GOOGLE_SEARCH_DAILY_LIMIT": "1000000",
+    }
+    return {"google_search": {"command": command, "args": args, "env": env}}
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def report(spans: list, elapsed: float, mismatches: int, api: FakeResponsesAPI) -> None:
+    turns = [s for s in spans if s["name"] == "turn"]
+    tool_calls = [s for s in spans if s["name"] == "tool_call"]
+    if not turns:
+        print("no turns recorded")
+        return
+    # 起動・終了を除いた、最初のターンの開始から最後のターンの終了までの時間
+    window = (max(s["end_time_unix_nano"] for s in turns) - min(s["start_time_unix_nano"] for s in turns)) / 1e9
+    print(f"elapsed        : {elapsed:.2f} s (turns: {window:.2f} s)")
+    print(f"turns          : {len(turns)} ({len(turns) / window:.2f} turns/s)")
+    print(f"tool calls     : {len(tool_calls)} ({len(tool_calls) / window:.2f} calls/s)")
+    print(f"llm requests   : {api.request_count}")
+    errors = sum(1 for s in spans if s["status"] != "OK" and s["name"] == "tool_call")
+    print(f"errors         : tool {errors} / api {len(api.errors)} / answer mismatch {mismatches}")
+    for error in api.errors[:5]:
+        print(f"  {error}")
+    print()
+    print(f"{'stage':<28} {'count':>6} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    by_name: dict = {}
+    for s in spans:
+        by_name.setdefault(s["name"], []).append(s["duration_ms"])
+    for name, values in sorted(by_name.items()):
+        print(
+            f"{name:<28} {len(values):>6} {percentile(values, 0.5):>9.1f} "
+            f"{percentile(values, 0.95):>9.1f} {percentile(values, 0.99):>9.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="chat_loopのオフラインベンチマーク")
+    parser.add_argument(
+        "--conversations",
+        default=os.path.join(HERE, "bench_conversations.jsonl"),
+        help="記録した会話（JSONL、形式はfake_responses_api.pyを参照）",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="会話を繰り返す回数")
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.0, help="Responses APIの最初のイベントまでの遅延（秒）"
+    )
+    parser.add_argument(
+        "--llm-interval", type=float, default=0.0, help="Responses APIのイベントごとの間隔（秒）"
+    )
+    parser.add_argument(
+        "--no-stream", action="store_true", help="LLMの応答をストリーミングで受け取らない"
+    )
+    parser.add_argument("--search-latency", type=float, default=0.0, help="検索APIの応答遅延（秒）")
+    parser.add_argument(
+        "--server-python",
+        help="google_searchサーバーを起動するPython（省略時はuv runで起動する）",
+    )
+    parser.add_argument(
+        "--no-tool-cache", action="store_true", help="ホスト側のツール結果キャッシュを使わない"
+    )
+    parser.add_argument("--verbose", action="store_true", help="ホストのログを表示する")
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.conversations)
+    turns = [turn for conversation in conversations for turn in conversation["turns"]] * args.repeat
+    trace_path = os.path.join(tempfile.mkdtemp(prefix="bench_chat_loop_"), "trace.jsonl")
+
+    with FakeResponsesAPI(
+        conversations, latency=args.llm_latency, interval=args.llm_interval
+    ) as api:
+        backend_port = free_port()
+        backend = start_search_backend(backend_port, args.search_latency)
+        try:
+            # ホストは環境変数を読み込み時に参照するため、設定してから読み込む
+            os.environ.update(
+                OPENAI_API_KEY="dummy-key", OPENAI_BASE_URL=api.url, TRACE_PATH=trace_path
+            )
+            if args.no_tool_cache:
+                os.environ["TOOL_CACHE_TTL"] = "0"
+            os.environ["OPENAI_STREAM"] = "false" if args.no_stream else "true"
+            import agent_chat_with_google_search as host
+
+            if not args.verbose:
+                logging.getLogger().setLevel(logging.WARNING)
+            servers = host.build_servers(
+                search_server_config(f"http://127.0.0.1:{backend_port}/", args.server_python)
+            )
+            # 発言を標準入力の代わりに流し込み、最後にexitで終了させる
+            lines = [turn["user"] for turn in turns] + ["exit"]
+            stdin, sys.stdin = sys.stdin, io.StringIO("\n".join(lines) + "\n")
+            captured = io.StringIO()
+            started = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(captured):
+                    asyncio.run(host.chat_loop(servers))
+            finally:
+                sys.stdin = stdin
+            elapsed = time.perf_counter() - started
+        finally:
+            backend.terminate()
+            backend.wait(timeout=10)
+
+    # 入力のプロンプト（"You: "）と同じ行に出力される回答を取り出し、台本の回答と比べる
+    answers = []
+    for line in captured.getvalue().splitlines():
+        line = line.removeprefix("You: ")
+        if line.startswith("Assistant: "):
+            answers.append(line[len("Assistant: "):])
+    mismatches = sum(1 for turn, answer in zip(turns, answers) if turn["answer"] != answer)
+    mismatches += abs(len(turns) - len(answers))
+    with open(trace_path, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f]
+    report(spans, elapsed, mismatches, api)
+    print(f"\ntrace          : {trace_path}")
+
+
+if __name__ == "__main__":
+    main()
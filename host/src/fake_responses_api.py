@@ -0,0 +1,281 @@
+"""OpenAI Responses APIのローカル代替サーバー（ベンチマーク用）。
+
+本物のAPIを使わずにホストを計測できるよう、POST /v1/responses に
+台本（記録した会話）どおりの応答を返す。ユーザーの発言ごとに、
+function_callの列（ステップ）を順番に返し、全てのステップが終わったら最終的な回答を返す。
+ツールの出力（function_call_output）のcall_idが直前に返したfunction_callと合わなければ400を返す。
+stream=trueのリクエストには、本物のAPIと同じイベント（response.output_text.delta、
+response.output_item.doneなど）をServer-Sent Eventsで少しずつ返す。
+応答遅延は、最初のイベントまでの待ち時間（latency）と、イベントごとの間隔（interval）で調整できる。
+
+台本（JSONL、1行に1会話）の形式:
+    {"name": "...", "turns": [
+        {"user": "発言",
+         "steps": [[{"name": "google_search__google_search", "arguments": {"query": "..."}}], ...],
+         "answer": "最終的な回答"}]}
+発言の文字列で台本を引くため、異なる台本の発言は重複しないようにする。
+
+単体で起動する場合:
+    uv run fake_responses_api.py --port 8766 --latency 0.2 --interval 0.02 --script bench_conversations.jsonl
+ホスト側は OPENAI_BASE_URL=http://127.0.0.1:8766/v1 を設定すると接続先が切り替わる。
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+def load_conversations(path: str) -> List[dict]:
+    """台本のJSONLファイルを読み込む"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stream_events(response: dict) -> List[dict]:
+    """応答を、ストリーミングで送るイベントの列に分解する"""
+    events = [
+        {"type": "response.created", "response": dict(response, status="in_progress", output=[])}
+    ]
+    for index, item in enumerate(response["output"]):
+        if item["type"] == "message":
+            text = item["content"][0]["text"]
+            events.append(
+                {
+                    "type": "response.output_item.added",
+                    "output_index": index,
+                    "item": dict(item, status="in_progress", content=[]),
+                }
+            )
+            # 回答は数文字ずつ（トークンの代わり）に区切って送る
+            for start in range(0, len(text), 4):
+                events.append(
+                    {
+                        "type": "response.output_text.delta",
+                        "item_id": item["id"],
+                        "output_index": index,
+                        "content_index": 0,
+                        "delta": text[start:start + 4],
+                    }
+                )
+        else:
+            events.append(
+                {
+                    "type": "response.output_item.added",
+                    "output_index": index,
+                    "item": dict(item, status="in_progress", arguments=""),
+                }
+            )
+            events.append(
+                {
+                    "type": "response.function_call_arguments.delta",
+                    "item_id": item["id"],
+                    "output_index": index,
+                    "delta": item["arguments"],
+                }
+            )
+        events.append({"type": "response.output_item.done", "output_index": index, "item": item})
+    events.append({"type": "response.completed", "response": response})
+    return events
+
+
+class FakeResponsesAPI:
+    """別スレッドで動くResponses APIの代替サーバー"""
+
+    def __init__(
+        self,
+        conversations: List[dict],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        interval: float = 0.0,
+    ) -> None:
+        self.latency = latency
+        self.interval = interval
+        self.request_count = 0
+        self.errors: List[str] = [] # 台本と合わなかったリクエスト
+        self._turns: Dict[str, dict] = {
+            turn["user"]: turn for conversation in conversations for turn in conversation["turns"]
+        }
+        # 応答IDごとに、どの発言の何番目のステップまで返したかと、返したcall_idを覚えておく
+        self._states: Dict[str, Tuple[Optional[dict], int, List[str]]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-Aliveを有効にする
+            disable_nagle_algorithm = True  # 小さな応答がNagleで遅延しないようにする
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if api.latency:
+                    time.sleep(api.latency)
+                if not self.path.rstrip("/").endswith("/responses"):
+                    self._reply(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+                    return
+                status, body = api.respond(request)
+                if status != 200:
+                    self._reply(status, body)
+                    return
+                events = stream_events(body)
+                if request.get("stream"):
+                    self._stream(events)
+                else:
+                    # ストリーミングと同じだけ生成に時間がかかったことにして、まとめて返す
+                    time.sleep(api.interval * len(events))
+                    self._reply(status, body)
+
+            def _stream(self, events: List[dict]) -> None:
+                """イベントをServer-Sent Eventsとして、intervalごとに1つずつ送る"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for index, event in enumerate(events):
+                    if index and api.interval:
+                        time.sleep(api.interval)
+                    event["sequence_number"] = index
+                    data = f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                    chunk = data.encode("utf-8")
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _reply(self, status: int, body: dict) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args) -> None:
+                pass  # 計測の邪魔になるのでアクセスログは出さない
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def _next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def respond(self, request: dict) -> Tuple[int, dict]:
+        """リクエストに対する (ステータス, 応答のJSON) を返す"""
+        with self._lock:
+            self.request_count += 1
+        items = request.get("input") or []
+        if isinstance(items, str):
+            items = [{"role": "user", "content": items}]
+        outputs = [i for i in items if i.get("type") == "function_call_output"]
+        if outputs:
+            # ツールの出力が来たら、直前に返したfunction_callに対応しているかを確かめて次のステップへ進む
+            with self._lock:
+                turn, step, call_ids = self._states.get(
+                    request.get("previous_response_id"), (None, 0, [])
+                )
+            received = [o.get("call_id") for o in outputs]
+            if sorted(received) != sorted(call_ids):
+                message = f"call_idが合いません: expected {call_ids}, got {received}"
+                with self._lock:
+                    self.errors.append(message)
+                return 400, {"error": {"message": message, "type": "invalid_request_error"}}
+            step += 1
+        else:
+            user_text = next(
+                (i.get("content") for i in reversed(items) if i.get("role") == "user"), ""
+            )
+            turn, step = self._turns.get(user_text), 0
+        return 200, self._build_response(request, turn, step)
+
+    def _build_response(self, request: dict, turn: Optional[dict], step: int) -> dict:
+        response_id = f"resp_{self._next_id()}"
+        steps = turn.get("steps", []) if turn else []
+        output: List[dict] = []
+        call_ids: List[str] = []
+        if step < len(steps):
+            for call in steps[step]:
+                n = self._next_id()
+                call_ids.append(f"call_{n}")
+                output.append(
+                    {
+                        "type": "function_call",
+                        "id": f"fc_{n}",
+                        "call_id": f"call_{n}",
+                        "name": call["name"],
+                        "arguments": json.dumps(call.get("arguments", {}), ensure_ascii=False),
+                        "status": "completed",
+                    }
+                )
+        else:
+            answer = turn.get("answer", "") if turn else "（台本にない発言です）"
+            output.append(
+                {
+                    "type": "message",
+                    "id": f"msg_{self._next_id()}",
+                    "role": "assistant",
+                    "status": "completed",
+                    "content": [{"type": "output_text", "text": answer, "annotations": []}],
+                }
+            )
+        with self._lock:
+            self._states[response_id] = (turn, step, call_ids)
+        return {
+            "id": response_id,
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": request.get("model", "fake"),
+            "status": "completed",
+            "output": output,
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+        }
+
+    @property
+    def url(self) -> str:
+        """OPENAI_BASE_URL に設定するURL"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def serve_forever(self) -> None:
+        """現在のスレッドでリクエストを処理し続ける"""
+        self._httpd.serve_forever()
+
+    def start(self) -> "FakeResponsesAPI":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeResponsesAPI":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI Responses APIのローカル代替サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="最初のイベントまでの遅延（秒）")
+    parser.add_argument("--interval", type=float, default=0.0, help="イベントごとの間隔（秒）")
+    parser.add_argument("--script", required=True, help="台本（会話のJSONL）")
+    args = parser.parse_args()
+
+    api = FakeResponsesAPI(
+        load_conversations(args.script), args.host, args.port, args.latency, args.interval
+    )
+    print(f"fake responses api: {api.url}")
+    try:
+        api.serve_forever()
+    except KeyboardInterrupt:
+        pass
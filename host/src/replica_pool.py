@@ -0,0 +1,137 @@
+# 1つのMCPサーバー設定から複数のプロセス（レプリカ）を起動し、ツール呼び出しを振り分けるためのモジュールです。
+# MCPサーバー1つだと、全ての処理が1本の標準入出力と1つのPythonインタープリターを通るため、
+# HTMLの変換のようにCPUを使うツールは、レプリカを増やすことで複数のCPUコアに分散できます。
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from mcp import ClientSession
+from mcp.types import Tool
+
+from server_supervisor import ServerSupervisor
+
+logger = logging.getLogger(__name__)
+
+# ツール呼び出しの振り分け方
+LEAST_OUTSTANDING = "least_outstanding" # 処理中の呼び出しが最も少ないレプリカに送る
+ROUND_ROBIN = "round_robin" # 順番に送る
+LOAD_BALANCE_POLICIES = (LEAST_OUTSTANDING, ROUND_ROBIN)
+
+
+class Replica:
+    """レプリカ1つ分のスーパーバイザーと、処理中の呼び出し数・所要時間の統計"""
+
+    def __init__(self, index: int, supervisor: ServerSupervisor, max_concurrency: int) -> None:
+        self.index = index
+        self.supervisor = supervisor
+        self.semaphore = asyncio.Semaphore(max_concurrency) # このプロセスに同時に送る呼び出しの上限
+        self.in_flight = 0 # 処理中（順番待ちを含む）の呼び出し数
+        self.calls = 0 # 完了した呼び出し数
+        self.errors = 0 # 例外で終わった呼び出し数
+        self.total_latency = 0.0 # 呼び出しにかかった時間の合計（秒）
+        self.max_latency = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.supervisor.session is not None
+
+    def stats(self) -> dict:
+        return {
+            "replica": self.index,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_latency / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_ms": round(self.max_latency * 1000, 1),
+            "restarts": self.supervisor.restarts,
+        }
+
+
+class ReplicaPool:
+    """同じ設定のMCPサーバーのレプリカをまとめて起動・停止し、呼び出しを振り分ける。"""
+
+    def __init__(
+        self,
+        name: str,
+        make_supervisor: Callable[[int], ServerSupervisor],
+        replicas: int = 1,
+        max_concurrency: int = 4,
+        policy: str = LEAST_OUTSTANDING,
+    ) -> None:
+        if policy not in LOAD_BALANCE_POLICIES:
+            raise ValueError(f"Unknown load balance policy: {policy}")
+        self.name = name
+        self.make_supervisor = make_supervisor
+        self.size = max(replicas, 1)
+        self.max_concurrency = max_concurrency
+        self.policy = policy
+        self.replicas: List[Replica] = []
+        self._counter = itertools.count()
+
+    async def start(self) -> List[Tool]:
+        """全てのレプリカを同時に起動し、ツールの一覧を返す。
+        一部のレプリカが起動に失敗しても、1つでも起動できれば残りで動かします。
+        """
+        supervisors = [self.make_supervisor(i) for i in range(self.size)]
+        results = await asyncio.gather(
+            *(supervisor.start() for supervisor in supervisors), return_exceptions=True
+        )
+        tools: Optional[List[Tool]] = None
+        first_error: Optional[BaseException] = None
+        for index, (supervisor, result) in enumerate(zip(supervisors, results)):
+            if isinstance(result, BaseException):
+                if self.size > 1:
+                    logger.warning(f"[{self.name}] replica {index} failed to start: {result!r}")
+                first_error = first_error or result
+                continue
+            self.replicas.append(Replica(index, supervisor, self.max_concurrency))
+            tools = result if tools is None else tools
+        if tools is None:
+            raise first_error
+        return tools
+
+    def pick(self) -> Replica:
+        """次の呼び出しを送るレプリカを選ぶ。再起動中のレプリカは、他に使えるものがあれば避けます。"""
+        # 同じ条件のレプリカが続けて選ばれないように、開始位置を1つずつずらして探します。
+        offset = next(self._counter) % len(self.replicas)
+        ordered = self.replicas[offset:] + self.replicas[:offset]
+        candidates = [r for r in ordered if r.available] or ordered
+        if self.policy == ROUND_ROBIN:
+            return candidates[0]
+        return min(candidates, key=lambda r: r.in_flight)
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float) -> AsyncIterator[Tuple[Replica, ClientSession]]:
+        """レプリカを1つ選び、そのセッションを使える間だけ貸し出す。
+        同時実行数の上限に達しているレプリカでは空きが出るまで待ち、
+        処理中の呼び出し数と所要時間を記録します。
+        """
+        replica = self.pick()
+        replica.in_flight += 1
+        try:
+            session = await replica.supervisor.wait_session(timeout)
+            async with replica.semaphore:
+                started = time.monotonic()
+                try:
+                    yield replica, session
+                except BaseException:
+                    replica.errors += 1
+                    raise
+                finally:
+                    elapsed = time.monotonic() - started
+                    replica.calls += 1
+                    replica.total_latency += elapsed
+                    replica.max_latency = max(replica.max_latency, elapsed)
+        finally:
+            replica.in_flight -= 1
+
+    async def stop(self) -> None:
+        """全てのレプリカを停止する。"""
+        await asyncio.gather(*(r.supervisor.stop() for r in self.replicas))
+
+    def stats(self) -> List[dict]:
+        """レプリカごとの統計を返す。"""
+        return [r.stats() for r in self.replicas]
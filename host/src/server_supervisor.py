@@ -0,0 +1,393 @@
+# MCPサーバーのプロセスを監視し、異常終了や応答しなくなったときに自動で再起動するためのモジュールです。
+# 定期的にpingを送って生存を確認し、失敗したらバックオフ（待ち時間を倍々に延ばす）しながら
+# 起動し直します（initializeとlist_toolsもやり直します）。
+# 予備のプロセス（ウォームスタンバイ）を起動しておけば、切り替えはミリ秒単位で終わります。
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import Any, AsyncContextManager, Awaitable, Callable, List, Optional
+
+import anyio
+from mcp import ClientSession
+from mcp.shared.exceptions import McpError
+from mcp.types import Tool
+
+from tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+
+# MCPサーバーへの接続を開く関数の型です。
+# stdio_client(...) や streamablehttp_client(...) のように、(read, write, ...) を返す
+# 非同期コンテキストマネージャを作って返します。
+Connector = Callable[[], AsyncContextManager[tuple]]
+
+# 接続が切れたことを示すMCPのエラーコードです（古いSDKには定義がないため値を直接書きます）。
+CONNECTION_CLOSED = -32000
+
+
+class ServerExitedError(ConnectionError):
+    """MCPサーバーのプロセスが終了した（接続が切れた）ため、呼び出しを続けられないときの例外"""
+
+
+def is_transport_error(e: BaseException) -> bool:
+    """接続やセッションが壊れたことによる失敗かどうかを返す。
+    ツールが遅いだけのタイムアウトや、ツール自体のエラーはFalseです（サーバーは生きているため）。
+    """
+    if isinstance(e, McpError):
+        return e.error.code == CONNECTION_CLOSED
+    return isinstance(
+        e, (ConnectionError, anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+    )
+
+
+class SessionProcess:
+    """MCPサーバーとの接続1つ（stdioならプロセス1つ）と、そのClientSession。
+    stdio_clientやClientSessionは開始したタスクの中で閉じる必要があるため、
+    専用のタスクでセッションを開いたまま維持します。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connect: Connector,
+        tracer: Optional[Tracer] = None,
+        on_exit: Optional[Callable[["SessionProcess"], Any]] = None,
+    ) -> None:
+        self.name = name
+        self.connect = connect
+        self.tracer = tracer or Tracer(name)
+        self.on_exit = on_exit # プロセスが終了した（接続が切れた）ときに呼び出す関数
+        self.session: Optional[ClientSession] = None
+        self.tools: List[Tool] = []
+        self.started_at = 0.0
+        self.exited = asyncio.Event() # stop()を呼ぶ前にプロセスが終了したらセットされる
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _watch_exit(self, stack: AsyncExitStack, read: Any, task_group: Any) -> Any:
+        """サーバーからの受信ストリームを中継し、終わった（プロセスが終了した）ことを検知する。
+        stdioではプロセスが終了すると標準出力が閉じ、受信ストリームが終わります。
+        """
+        send, receive = anyio.create_memory_object_stream(0)
+
+        async def forward() -> None:
+            async with send:
+                try:
+                    async for message in read:
+                        await send.send(message)
+                except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+                    pass
+            # 終了の合図より先にストリームが終わった場合は、プロセスが終了しています。
+            if not self._stop.is_set():
+                logger.warning(f"[{self.name}] server process exited")
+                self.exited.set()
+                if self.on_exit is not None:
+                    self.on_exit(self)
+
+        task_group.start_soon(forward)
+        # セッションを閉じた後、接続を閉じる前に中継を止めます。
+        stack.callback(task_group.cancel_scope.cancel)
+        return receive
+
+    async def _run(self, ready: asyncio.Future) -> None:
+        try:
+            async with AsyncExitStack() as stack:
+                # 起動・initialize・list_toolsのそれぞれにかかった時間を記録します。
+                with self.tracer.span("mcp.spawn", server=self.name):
+                    read, write, *_ = await stack.enter_async_context(self.connect())
+                    task_group = await stack.enter_async_context(anyio.create_task_group())
+                    read = self._watch_exit(stack, read, task_group)
+                    session = await stack.enter_async_context(ClientSession(read, write))
+                with self.tracer.span("mcp.initialize", server=self.name):
+                    await session.initialize()
+                with self.tracer.span("mcp.list_tools", server=self.name):
+                    response = await session.list_tools()
+                self.session = session
+                self.tools = response.tools
+                self.started_at = time.monotonic()
+                ready.set_result(response.tools)
+                # 終了の合図があるまでセッションを開いたままにします。
+                await self._stop.wait()
+        except Exception as e:
+            # 起動前に失敗した場合は、その例外を起動を待っている側に伝えます。
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.error(f"[{self.name}] session closed with error: {e!r}")
+        finally:
+            self.session = None
+
+    async def start(self, timeout: float) -> List[Tool]:
+        """プロセスを起動し、initializeとlist_toolsが終わったらツールの一覧を返す。
+        起動時間の上限を超えた場合はタスクを停止してasyncio.TimeoutErrorを送出します。
+        """
+        ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(ready))
+        try:
+            return await asyncio.wait_for(asyncio.shield(ready), timeout=timeout)
+        except asyncio.TimeoutError:
+            # 起動が間に合わなかったプロセスは停止します（終了は待たずに戻ります）。
+            self._task.cancel()
+            raise
+        except asyncio.CancelledError:
+            # 起動を取りやめた場合は、プロセスが終了するのを待ってから戻ります。
+            self._task.cancel()
+            await asyncio.wait({self._task})
+            if ready.done() and not ready.cancelled():
+                ready.exception() # 中断で起きた例外は誰も受け取らないため、ここで読み捨てます
+            raise
+
+    @property
+    def uptime(self) -> float:
+        return time.monotonic() - self.started_at
+
+    async def ping(self, timeout: float) -> None:
+        """pingを送り、timeout秒以内に応答がなければasyncio.TimeoutErrorを送出する。"""
+        if self.session is None or self.exited.is_set():
+            raise ServerExitedError(f"MCP server '{self.name}' is not running")
+        await self.guard(asyncio.wait_for(self.session.send_ping(), timeout=timeout))
+
+    async def guard(self, aw: Awaitable) -> Any:
+        """awの完了を待つ。途中でプロセスが終了したら中断してServerExitedErrorを送出する。
+        SDKによっては接続が切れても応答待ちのリクエストが終わらないため、終了をこちらで待ち合わせます。
+        """
+        if self.exited.is_set():
+            raise ServerExitedError(f"MCP server '{self.name}' exited")
+        task = asyncio.ensure_future(aw)
+        exited = asyncio.create_task(self.exited.wait())
+        try:
+            await asyncio.wait({task, exited}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            exited.cancel()
+            if not task.done():
+                task.cancel()
+                await asyncio.wait({task})
+        if task.cancelled() and self.exited.is_set():
+            raise ServerExitedError(f"MCP server '{self.name}' exited")
+        return task.result()
+
+    async def stop(self) -> None:
+        """終了を知らせ、セッションが閉じるのを待つ。"""
+        if self._task is None:
+            return
+        self._stop.set()
+        # asyncio.waitは待っている側が中断されてもセッションのタスクを中断しません。
+        await asyncio.wait({self._task})
+
+
+class ServerSupervisor:
+    """1つのMCPサーバーのセッションを監視し、異常があれば再起動する。
+
+    - health_interval秒ごと（またはreport_failure()が呼ばれた直後）にpingで生存を確認します。
+    - 応答がなければ、予備のプロセスがあればそれに切り替え、なければ起動し直します。
+      起動に失敗したり、起動してすぐに落ちたりする場合は、待ち時間を倍々に延ばします。
+    - 再起動でツールの一覧が変わった場合は、on_tools_changedを呼び出します。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connect: Connector,
+        startup_timeout: float,
+        health_interval: float,
+        health_timeout: float,
+        warm_standby: bool = False,
+        backoff: float = 0.5,
+        backoff_max: float = 30.0,
+        on_tools_changed: Optional[Callable[[List[Tool]], Any]] = None,
+        tracer: Optional[Tracer] = None,
+    ) -> None:
+        self.name = name
+        self.connect = connect
+        self.startup_timeout = startup_timeout
+        self.health_interval = health_interval # 0以下ならreport_failure()のときだけ確認する
+        self.health_timeout = health_timeout
+        self.warm_standby = warm_standby
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.on_tools_changed = on_tools_changed
+        self.tracer = tracer
+        self.current: Optional[SessionProcess] = None # ツール呼び出しに使うプロセス
+        self.standby: Optional[SessionProcess] = None # 切り替え用の予備のプロセス
+        self.restarts = 0 # 再起動した回数
+        self.last_recovery = 0.0 # 直近の再起動にかかった秒数
+        self._delay = 0.0 # 次に起動し直すまでの待ち時間
+        self._filling: Optional[asyncio.Task] = None # 予備のプロセスを起動中のタスク
+        self._available = asyncio.Event() # 正常なセッションがある間だけセットされる
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = [] # 監視・予備の起動・古いプロセスの停止を行うタスク
+        self._retired: List[SessionProcess] = [] # 切り離して停止中のプロセス
+
+    @property
+    def session(self) -> Optional[ClientSession]:
+        """正常なセッションを返す（再起動中ならNone）。"""
+        if self.current is None or not self._available.is_set():
+            return None
+        return self.current.session
+
+    def _spawn_background(self, coro: Any) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.append(task)
+        task.add_done_callback(self._tasks.remove)
+
+    def _retire(self, proc: SessionProcess) -> None:
+        """使えなくなったプロセスをバックグラウンドで停止する。"""
+        self._retired.append(proc)
+
+        async def stop() -> None:
+            await proc.stop()
+            self._retired.remove(proc)
+
+        self._spawn_background(stop())
+
+    async def _spawn(self) -> SessionProcess:
+        proc = SessionProcess(self.name, self.connect, self.tracer, on_exit=self._on_exit)
+        await proc.start(self.startup_timeout)
+        return proc
+
+    async def _spawn_standby(self) -> None:
+        try:
+            self.standby = await self._spawn()
+            logger.info(f"[{self.name}] warm standby ready")
+        except Exception as e:
+            logger.warning(f"[{self.name}] failed to start warm standby: {e!r}")
+
+    def _fill_standby(self) -> None:
+        """予備のプロセスがなく、起動中でもなければ起動を始める。"""
+        if not self.warm_standby or self.standby is not None:
+            return
+        if self._filling is not None and not self._filling.done():
+            return
+        self._filling = asyncio.create_task(self._spawn_standby())
+        self._tasks.append(self._filling)
+        self._filling.add_done_callback(self._tasks.remove)
+
+    async def start(self) -> List[Tool]:
+        """サーバーを起動して監視を始め、ツールの一覧を返す。起動に失敗したら例外を送出する。"""
+        self.current = await self._spawn()
+        self._available.set()
+        self._spawn_background(self._supervise())
+        self._fill_standby()
+        return self.current.tools
+
+    async def wait_session(self, timeout: float) -> ClientSession:
+        """正常なセッションを返す。再起動中なら最大timeout秒まで復旧を待つ。"""
+        await asyncio.wait_for(self._available.wait(), timeout=timeout)
+        return self.current.session
+
+    def report_failure(self, session: Optional[ClientSession] = None) -> None:
+        """接続やセッションが壊れてツール呼び出しが失敗したことを知らせ、すぐに生存確認を行わせる。
+        確認が終わるまでは、後続の呼び出しは（壊れているかもしれない）セッションを使わずに待ちます。
+        ツールが遅いだけのタイムアウトでは呼び出さないでください（is_transport_error()で判定します）。
+        """
+        if session is not None and (self.current is None or session is not self.current.session):
+            return # 既に切り替わった古いセッションでの失敗
+        self._available.clear()
+        self._wake.set()
+
+    def _on_exit(self, proc: SessionProcess) -> None:
+        """プロセスの終了を検知したら、生存確認を待たずにすぐ復旧を始める。"""
+        if proc is self.current:
+            self._available.clear()
+            self._wake.set()
+        elif proc is self.standby:
+            self.standby = None
+            self._retire(proc)
+            self._fill_standby()
+
+    async def guard(self, session: ClientSession, aw: Awaitable) -> Any:
+        """sessionでの呼び出しawを、そのプロセスが途中で終了したら中断して待つ。"""
+        proc = self.current
+        if proc is None or proc.session is not session:
+            return await aw
+        return await proc.guard(aw)
+
+    async def _healthy(self) -> bool:
+        if self.current.exited.is_set():
+            return False
+        try:
+            await self.current.ping(self.health_timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"[{self.name}] health check failed: {e!r}")
+            return False
+
+    async def _supervise(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(),
+                    timeout=self.health_interval if self.health_interval > 0 else None,
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if await self._healthy():
+                self._available.set()
+            else:
+                await self._restart()
+
+    async def _restart(self) -> None:
+        """使えなくなったプロセスを切り離し、予備への切り替えか起動し直しで復旧する。"""
+        self._available.clear()
+        started = time.monotonic()
+        old = self.current
+        self._retire(old)
+        # しばらく動いていた場合はすぐに起動し直し、起動してすぐに落ちた場合は待ち時間を延ばします。
+        if old.uptime > self.backoff_max:
+            self._delay = 0.0
+        while True:
+            proc, self.standby = self.standby, None
+            if proc is not None:
+                try:
+                    await proc.ping(self.health_timeout)
+                    how = "standby"
+                    break
+                except Exception:
+                    self._retire(proc)
+                    continue
+            if self._filling is not None and not self._filling.done():
+                # 予備のプロセスが起動中なら、一から起動するよりもそれを待つ方が早く済みます。
+                await asyncio.wait({self._filling})
+                continue
+            await asyncio.sleep(self._delay)
+            self._delay = min(max(self._delay * 2, self.backoff), self.backoff_max)
+            try:
+                proc = await self._spawn()
+                how = "cold start"
+                break
+            except Exception as e:
+                logger.error(f"[{self.name}] restart failed: {e!r}")
+        self.current = proc
+        self.restarts += 1
+        self.last_recovery = time.monotonic() - started
+        self._available.set()
+        logger.info(
+            f"[{self.name}] recovered by {how} in {self.last_recovery * 1000:.0f} ms "
+            f"(restarts: {self.restarts})"
+        )
+        if proc.tools != old.tools and self.on_tools_changed is not None:
+            self.on_tools_changed(proc.tools)
+        self._fill_standby()
+
+    async def stop(self) -> None:
+        """監視を止め、全てのプロセスを停止する。"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        procs = [p for p in (self.current, self.standby, *self._retired) if p is not None]
+        await asyncio.gather(*(p.stop() for p in procs))
+        self.current = self.standby = None
+        self._available.clear()
+
+    def stats(self) -> dict:
+        """再起動の回数などを返す。"""
+        return {
+            "available": self._available.is_set(),
+            "restarts": self.restarts,
+            "last_recovery_ms": round(self.last_recovery * 1000, 1),
+            "standby": self.standby is not None,
+        }
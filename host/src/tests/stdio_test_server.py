@@ -0,0 +1,30 @@
+"""スーパーバイザーのテストで起動する、小さなstdioのMCPサーバー"""
+import asyncio
+import os
+
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("test_server")
+
+
+@mcp.tool()
+def pid() -> str:
+    """このプロセスのIDを返す"""
+    return str(os.getpid())
+
+
+@mcp.tool()
+async def slow(seconds: float) -> str:
+    """seconds秒待ってから返す"""
+    await asyncio.sleep(seconds)
+    return "done"
+
+
+@mcp.tool()
+def crash() -> str:
+    """応答せずにプロセスを終了する"""
+    os._exit(1)
+
+
+if __name__ == "__main__":
+    mcp.run()
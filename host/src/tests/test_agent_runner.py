@@ -0,0 +1,34 @@
+import asyncio
+import io
+import json
+from types import SimpleNamespace
+
+from agent_runner import ResultWriter, read_conversations, run_all
+
+
+class FakeAgent:
+    async def run_turn(self, prompt, previous_id):
+        return SimpleNamespace(id=f"resp-{prompt}", output_text=prompt.upper())
+
+
+def test_malformed_lines_are_reported_and_skipped():
+    lines = [
+        '{"id": "a", "prompts": ["x", "y"]}',
+        "{not json",
+        '{"id": "b"}',
+        '{"id": "c", "prompts": "z"}',
+        "[1, 2]",
+        "",
+        '{"id": "d", "prompt": "w"}',
+    ]
+    output = io.StringIO()
+    writer = ResultWriter(output)
+    conversations = read_conversations(io.StringIO("\n".join(lines) + "\n"))
+    count = asyncio.run(run_all(conversations, writer, 2, FakeAgent()))
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert count == 2
+    assert sorted(r["line"] for r in records if "error" in r) == [2, 3, 4, 5]
+    outputs = {(r["id"], r["turn"]): r["output"] for r in records if "output" in r}
+    assert outputs == {("a", 1): "X", ("a", 2): "Y", ("d", 1): "W"}
+    assert writer.errors == 4
@@ -0,0 +1,31 @@
+import asyncio
+
+from mcp.types import Tool
+
+import agent_chat_with_google_search as agent
+from tool_manifest_cache import ToolManifestCache
+from tool_registry import ToolRegistry
+
+
+def make_tool(name: str) -> Tool:
+    return Tool(name=name, description=name, inputSchema={"type": "object", "properties": {}})
+
+
+def test_lazy_start_replaces_stale_manifest_tools(tmp_path, monkeypatch):
+    server = agent.MCPServer(name="search", command="python", args=["server.py"], lazy=True)
+    manifests = ToolManifestCache(str(tmp_path / "manifest.json"), max_age=86400)
+    manifests.put(server.tool_manifest_key(), server.name, [make_tool("old_search")])
+    registry = ToolRegistry()
+    registry.register(server, manifests.get(server.tool_manifest_key()))
+
+    async def fake_start_server(server, on_tools_changed=None):
+        server.pool = object()
+        return [make_tool("google_search"), make_tool("google_search_many")]
+
+    monkeypatch.setattr(agent, "start_server", fake_start_server)
+    pool = asyncio.run(agent.ensure_pool(server, registry, manifests))
+
+    assert pool is server.pool
+    names = sorted(tool["name"] for tool in registry.openai_tools)
+    assert names == ["search__google_search", "search__google_search_many"]
+    assert [t.name for t in manifests.get(server.tool_manifest_key())] == ["google_search", "google_search_many"]
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from replica_pool import LEAST_OUTSTANDING, ROUND_ROBIN, ReplicaPool
+
+
+class FakeSupervisor:
+    """ReplicaPoolから使う分だけを真似たスーパーバイザー"""
+
+    def __init__(self, index: int, fail: bool = False) -> None:
+        self.index = index
+        self.fail = fail
+        self.session = f"session-{index}"
+        self.restarts = 0
+        self.stopped = False
+
+    async def start(self):
+        if self.fail:
+            raise RuntimeError(f"replica {self.index} failed")
+        return ["tool"]
+
+    async def wait_session(self, timeout: float):
+        return self.session
+
+    async def stop(self) -> None:
+        self.stopped = True
+
+
+def make_pool(replicas: int, policy: str = LEAST_OUTSTANDING, failing=(), max_concurrency: int = 4):
+    return ReplicaPool(
+        "test",
+        lambda i: FakeSupervisor(i, fail=i in failing),
+        replicas=replicas,
+        max_concurrency=max_concurrency,
+        policy=policy,
+    )
+
+
+async def call(pool: ReplicaPool, seconds: float = 0.0) -> int:
+    async with pool.acquire(timeout=1) as (replica, session):
+        await asyncio.sleep(seconds)
+        return replica.index
+
+
+def test_least_outstanding_spreads_concurrent_calls():
+    async def main():
+        pool = make_pool(3)
+        await pool.start()
+        indexes = await asyncio.gather(*(call(pool, 0.05) for _ in range(6)))
+        return sorted(indexes), pool.stats()
+
+    indexes, stats = asyncio.run(main())
+    assert indexes == [0, 0, 1, 1, 2, 2]
+    assert [s["calls"] for s in stats] == [2, 2, 2]
+    assert all(s["in_flight"] == 0 for s in stats)
+
+
+def test_least_outstanding_avoids_a_busy_replica():
+    async def main():
+        pool = make_pool(2)
+        await pool.start()
+        busy = asyncio.create_task(call(pool, 0.2))
+        await asyncio.sleep(0.01)
+        quick = [await call(pool) for _ in range(3)]
+        return await busy, quick
+
+    busy, quick = asyncio.run(main())
+    assert quick == [1 - busy] * 3
+
+
+def test_round_robin_cycles_through_replicas():
+    async def main():
+        pool = make_pool(3, policy=ROUND_ROBIN)
+        await pool.start()
+        return [await call(pool) for _ in range(6)]
+
+    assert asyncio.run(main()) == [0, 1, 2, 0, 1, 2]
+
+
+def test_restarting_replica_is_skipped():
+    async def main():
+        pool = make_pool(2, policy=ROUND_ROBIN)
+        await pool.start()
+        pool.replicas[0].supervisor.session = None  # 再起動中
+        return [await call(pool) for _ in range(4)]
+
+    assert asyncio.run(main()) == [1, 1, 1, 1]
+
+
+def test_pool_starts_with_surviving_replicas_and_fails_when_none_start():
+    async def main():
+        partial = make_pool(3, failing={1})
+        tools = await partial.start()
+        assert tools == ["tool"]
+        assert [r.index for r in partial.replicas] == [0, 2]
+        with pytest.raises(RuntimeError):
+            await make_pool(2, failing={0, 1}).start()
+
+    asyncio.run(main())
+
+
+def test_max_concurrency_queues_calls_per_replica():
+    async def main():
+        pool = make_pool(1, max_concurrency=2)
+        await pool.start()
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(*(call(pool, 0.1) for _ in range(4)))
+        return asyncio.get_running_loop().time() - started
+
+    assert asyncio.run(main()) >= 0.19
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        make_pool(1, policy="random")
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from mcp import StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import ErrorData
+
+from server_supervisor import CONNECTION_CLOSED, ServerExitedError, ServerSupervisor, is_transport_error
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(__file__), "stdio_test_server.py")
+
+
+def connect():
+    return stdio_client(StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT]))
+
+
+def make_supervisor(**options) -> ServerSupervisor:
+    options = {"startup_timeout": 20, "health_interval": 0, "health_timeout": 5, "backoff": 0.1, **options}
+    return ServerSupervisor("test", connect, **options)
+
+
+async def call(supervisor: ServerSupervisor, tool: str, **args):
+    session = await supervisor.wait_session(20)
+    return await supervisor.guard(session, session.call_tool(tool, args))
+
+
+async def server_pid(supervisor: ServerSupervisor) -> str:
+    result = await call(supervisor, "pid")
+    return result.content[0].text
+
+
+@pytest.mark.parametrize("warm_standby", [False, True])
+def test_crashed_server_is_restarted(warm_standby):
+    async def main():
+        supervisor = make_supervisor(warm_standby=warm_standby)
+        tools = await supervisor.start()
+        try:
+            assert {tool.name for tool in tools} == {"pid", "slow", "crash"}
+            if warm_standby:
+                while supervisor.standby is None:
+                    await asyncio.sleep(0.05)
+            before = await server_pid(supervisor)
+            with pytest.raises(Exception) as failure:
+                await call(supervisor, "crash")
+            assert is_transport_error(failure.value)
+            after = await server_pid(supervisor)
+            return before, after, supervisor.stats()
+        finally:
+            await supervisor.stop()
+
+    before, after, stats = asyncio.run(main())
+    assert before != after
+    assert stats["restarts"] == 1
+    assert stats["available"]
+
+
+def test_slow_tool_timeout_does_not_restart_server():
+    async def main():
+        supervisor = make_supervisor()
+        await supervisor.start()
+        try:
+            before = await server_pid(supervisor)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(call(supervisor, "slow", seconds=5), timeout=0.2)
+            return before, await server_pid(supervisor), supervisor.stats()
+        finally:
+            await supervisor.stop()
+
+    before, after, stats = asyncio.run(main())
+    assert before == after
+    assert stats["restarts"] == 0
+
+
+def test_transport_errors_are_told_apart_from_tool_errors():
+    assert is_transport_error(ServerExitedError("exited"))
+    assert is_transport_error(McpError(ErrorData(code=CONNECTION_CLOSED, message="Connection closed")))
+    assert not is_transport_error(McpError(ErrorData(code=-32602, message="Invalid params")))
+    assert not is_transport_error(asyncio.TimeoutError())
+    assert not is_transport_error(ValueError("tool failed"))
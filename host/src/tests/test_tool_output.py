@@ -0,0 +1,41 @@
+from tool_output import ToolOutput, fit_to_budget
+
+
+def test_fit_to_budget_sum_stays_within_budget():
+    outputs = [ToolOutput.from_text(c * n, 20000) for c, n in (("a", 50), ("b", 500), ("c", 5))]
+    rendered = fit_to_budget(outputs, 100)
+    assert sum(len(r) for r in rendered) <= 100
+    assert rendered[2] == "c" * 5  # 小さい出力はそのまま残る
+
+
+def test_fit_to_budget_keeps_everything_when_it_fits():
+    outputs = [ToolOutput.from_text("x" * 30, 20000), ToolOutput.from_text("y" * 40, 20000)]
+    assert fit_to_budget(outputs, 100) == ["x" * 30, "y" * 40]
+
+
+def test_render_never_exceeds_limit():
+    text = "".join(chr(0x3041 + i % 80) for i in range(5000))
+    for buffer_limit in (100, 1000, 20000):
+        output = ToolOutput(buffer_limit)
+        for start in range(0, len(text), 333):  # 少しずつ書き込む
+            output.write(text[start:start + 333])
+        for limit in (0, 10, 60, 90, 150, 999, 1000, 4999, 5000, 6000):
+            rendered = output.render(limit)
+            assert len(rendered) <= min(limit, buffer_limit)
+            if len(text) <= min(limit, buffer_limit):
+                assert rendered == text
+
+
+def test_truncated_output_keeps_head_and_tail():
+    text = "H" * 300 + "m" * 5000 + "T" * 300
+    rendered = ToolOutput.from_text(text, 1000).render()
+    assert len(rendered) <= 1000
+    assert rendered.startswith("H" * 100)
+    assert rendered.endswith("T" * 100)
+    assert "省略しました" in rendered
+
+
+def test_small_limit_still_marks_omission():
+    rendered = ToolOutput.from_text("a" * 50, 20000).render(20)
+    assert len(rendered) == 20
+    assert rendered.endswith("…")
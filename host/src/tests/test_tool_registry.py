@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+from mcp.types import Tool
+
+from tool_registry import MAX_TOOL_NAME_LENGTH, ToolRegistry, mangle_tool_name
+
+
+def make_tool(name: str) -> Tool:
+    return Tool(name=name, inputSchema={"type": "object"})
+
+
+LONG_TOOL = "search_" + "x" * 80
+
+
+def test_fallback_name_is_not_reused_when_taken():
+    fallback = mangle_tool_name("srv", LONG_TOOL, {})
+    name = mangle_tool_name("srv", LONG_TOOL, {fallback: object()})
+    assert name != fallback
+    assert len(name) <= MAX_TOOL_NAME_LENGTH
+
+
+def test_real_tool_named_like_fallback_is_kept():
+    # 先に登録したツールの名前が、後のツールのハッシュ付きの名前とちょうど同じになる場合
+    fallback = mangle_tool_name("srv", LONG_TOOL, {})
+    server = SimpleNamespace(name="srv")
+    registry = ToolRegistry()
+    registry.register(server, [make_tool(fallback[len("srv__"):]), make_tool(LONG_TOOL)])
+
+    assert len(registry) == 2
+    assert registry.lookup(fallback).tool.name == fallback[len("srv__"):]
+    names = [t["name"] for t in registry.openai_tools]
+    assert len(set(names)) == 2
+    assert all(len(n) <= MAX_TOOL_NAME_LENGTH for n in names)
+
+
+def test_raises_when_no_free_name():
+    class Everything(dict):
+        def __contains__(self, key):
+            return True
+
+    with pytest.raises(ValueError):
+        mangle_tool_name("srv", LONG_TOOL, Everything())
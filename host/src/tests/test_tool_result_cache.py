@@ -0,0 +1,12 @@
+from tool_result_cache import cache_key, requests_bypass
+
+
+def test_requests_bypass_only_when_true():
+    assert requests_bypass({"query": "mcp", "bypass_cache": True})
+    assert not requests_bypass({"query": "mcp", "bypass_cache": False})
+    assert not requests_bypass({"query": "mcp"})
+    assert not requests_bypass(None)
+
+
+def test_cache_key_ignores_argument_order():
+    assert cache_key("s", "t", {"a": 1, "b": 2}) == cache_key("s", "t", {"b": 2, "a": 1})
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+HOST_TRACING = os.path.join(os.path.dirname(__file__), "..", "tracing.py")
+SERVER_TRACING = os.path.join(os.path.dirname(__file__), "..", "..", "..", "servers", "src", "tracing.py")
+
+
+def code_without_header(path: str) -> list[str]:
+    """冒頭のコメントを除いた行"""
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    start = next(i for i, line in enumerate(lines) if not line.startswith("#"))
+    return lines[start:]
+
+
+@pytest.mark.skipif(not os.path.exists(SERVER_TRACING), reason="servers/src/tracing.py がありません")
+def test_server_tracing_is_a_copy_of_host_tracing():
+    assert code_without_header(SERVER_TRACING) == code_without_header(HOST_TRACING)
@@ -0,0 +1,81 @@
+# MCPサーバーが提供するツールの一覧（マニフェスト）をディスクに保存するためのモジュールです。
+# 保存しておいたマニフェストを使うと、サーバーを起動しなくてもLLMにツールを提示できます。
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from mcp.types import Tool
+
+
+def package_fingerprint(command: str, args: List[str], version: Optional[str] = None) -> str:
+    """サーバーのパッケージのバージョンを表す文字列を返す。
+    設定でversionが指定されていればそれを使い、なければ `--directory` で指定された
+    ディレクトリのpyproject.toml・uv.lock・スクリプトの更新日時とサイズから作ります。
+    （uvx の場合は `mcp-server-fetch==x.y.z` のように引数にバージョンを含めてください）
+    """
+    if version:
+        return version
+    if "--directory" not in args:
+        return ""
+    directory = args[args.index("--directory") + 1]
+    candidates = ["pyproject.toml", "uv.lock"] + [a for a in args if a.endswith(".py")]
+    parts = []
+    for name in candidates:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            parts.append(f"{name}:{stat.st_mtime_ns}:{stat.st_size}")
+    return ";".join(parts)
+
+
+def manifest_key(command: str, args: List[str], version: Optional[str] = None) -> str:
+    """コマンド・引数・パッケージのバージョンからマニフェストのキーを作る。"""
+    raw = json.dumps([command, args, package_fingerprint(command, args, version)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ToolManifestCache:
+    """ツールのマニフェストをJSONファイルに保存・読み込みするキャッシュ。"""
+
+    def __init__(self, path: str, max_age: float) -> None:
+        self.path = path # 保存先のファイル
+        self.max_age = max_age # この秒数より古いマニフェストはバックグラウンドで再検証する
+        self._entries: Dict[str, dict] = self._read()
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self) -> None:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path) # 書き込み途中で壊れないように置き換える
+
+    def get(self, key: str) -> Optional[List[Tool]]:
+        """保存されたツールの一覧を返す（なければNone）。"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return [Tool.model_validate(t) for t in entry["tools"]]
+
+    def is_stale(self, key: str) -> bool:
+        """保存してからmax_ageを超えていればTrueを返す。"""
+        entry = self._entries.get(key)
+        return entry is None or time.time() - entry["saved_at"] > self.max_age
+
+    def put(self, key: str, server_name: str, tools: List[Tool]) -> bool:
+        """ツールの一覧を保存する。内容が変わっていればTrueを返す。"""
+        dumped = [t.model_dump(mode="json", exclude_none=True) for t in tools]
+        previous = self._entries.get(key)
+        changed = previous is None or previous["tools"] != dumped
+        self._entries[key] = {"server": server_name, "saved_at": time.time(), "tools": dumped}
+        self._write()
+        return changed
@@ -0,0 +1,144 @@
+# ツールの出力をLLMに渡す前に、決められた文字数に収めるためのモジュールです。
+# 大きなWebページをfetchした結果などをそのまま次のリクエストに貼り付けると、
+# 応答が遅くなりトークンの料金も増えるため、先頭と末尾だけを残して途中を省略します。
+# 出力は少しずつ書き込み、先頭と末尾の分だけを保持するので、元の出力が大きくてもメモリを使いません。
+import base64
+from collections import deque
+from typing import Any, Deque, List, Optional
+
+# 残す文字数のうち、先頭に割り当てる割合（残りは末尾に割り当てます）
+HEAD_RATIO = 0.7
+
+
+class ToolOutput:
+    """ツールの出力を、先頭と末尾だけを保持しながら書き込むバッファ。
+    limitを超えた分は、render()のときに省略した文字数を示す目印に置き換えます。
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(limit, 0)
+        self.head_limit = int(self.limit * HEAD_RATIO)
+        self.tail_limit = self.limit - self.head_limit
+        self.total = 0 # 書き込まれた文字数の合計
+        self._head: List[str] = []
+        self._head_len = 0
+        self._tail: Deque[str] = deque()
+        self._tail_len = 0
+
+    @classmethod
+    def from_text(cls, text: str, limit: int) -> "ToolOutput":
+        output = cls(limit)
+        output.write(text)
+        return output
+
+    def write(self, text: str) -> None:
+        """文字列を追加する。先頭の枠を埋めた後は、末尾の枠に入る分だけを残します。"""
+        self.total += len(text)
+        room = self.head_limit - self._head_len
+        if room > 0:
+            self._head.append(text[:room])
+            self._head_len += min(room, len(text))
+            text = text[room:]
+        if not text:
+            return
+        self._tail.append(text)
+        self._tail_len += len(text)
+        # 末尾の枠から外れた古い断片を捨てます。
+        while self._tail and self._tail_len - len(self._tail[0]) >= self.tail_limit:
+            self._tail_len -= len(self._tail.popleft())
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > self.limit
+
+    def render(self, limit: Optional[int] = None) -> str:
+        """limit文字（省略時は作成時の上限）に収めた文字列を返す。
+        省略した文字数を示す目印もlimitの中に含めます。
+        """
+        limit = self.limit if limit is None else min(limit, self.limit)
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        if not self.truncated:
+            # 何も捨てていなければ、先頭と末尾をつなげたものが出力の全体です。
+            head = tail = head + tail
+            if self.total <= limit:
+                return head
+        # 目印の長さは数字の桁数で変わるため、最も長くなる場合の長さで残す文字数を決めます。
+        keep = limit - len(omission_marker(self.total, self.total, limit, limit))
+        if keep <= 0:
+            # 目印も入らないほど小さい上限では、先頭だけを返し、省略したことを「…」だけで示します。
+            return head[: limit - 1] + "…" if limit > 0 else ""
+        head_len = int(keep * HEAD_RATIO)
+        tail_len = keep - head_len
+        omitted = self.total - head_len - tail_len
+        marker = omission_marker(omitted, self.total, head_len, tail_len)
+        return head[:head_len] + marker + (tail[-tail_len:] if tail_len else "")
+
+
+def omission_marker(omitted: int, total: int, head_len: int, tail_len: int) -> str:
+    """省略した文字数を示す目印"""
+    return (
+        f"\n\n…（{omitted}文字を省略しました。全{total}文字のうち"
+        f"先頭{head_len}文字と末尾{tail_len}文字を表示しています）…\n\n"
+    )
+
+
+def decoded_size(data: str) -> int:
+    """base64で表された値のバイト数を返す。"""
+    try:
+        return len(base64.b64decode(data, validate=False))
+    except ValueError:
+        return len(data) * 3 // 4
+
+
+def write_content(output: ToolOutput, item: Any) -> None:
+    """ツールの結果に含まれるコンテンツ1つを、LLMに渡す文字列として書き込む。
+    画像・音声・バイナリのリソースはそのまま渡せないため、種類と大きさだけを書き込みます。
+    """
+    kind = getattr(item, "type", None)
+    if kind == "text":
+        output.write(item.text)
+    elif kind in ("image", "audio"):
+        label = "画像" if kind == "image" else "音声"
+        output.write(f"[{label}: {item.mimeType}, {decoded_size(item.data)} bytes]")
+    elif kind == "resource":
+        resource = item.resource
+        mime = f" ({resource.mimeType})" if resource.mimeType else ""
+        if hasattr(resource, "text"):
+            output.write(f"[リソース: {resource.uri}{mime}]\n")
+            output.write(resource.text)
+        else:
+            output.write(f"[リソース: {resource.uri}{mime}, {decoded_size(resource.blob)} bytes]")
+    elif kind == "resource_link":
+        output.write(f"[リンク: {item.name} {item.uri}]")
+    else:
+        output.write(f"[未対応のコンテンツ: {kind}]")
+
+
+def render_contents(contents: List[Any], limit: int, prefix: str = "") -> ToolOutput:
+    """ツールの結果の全てのコンテンツを順番に書き込んだToolOutputを返す。"""
+    output = ToolOutput(limit)
+    output.write(prefix)
+    for index, item in enumerate(contents):
+        if index:
+            output.write("\n\n")
+        write_content(output, item)
+    return output
+
+
+def fit_to_budget(outputs: List[ToolOutput], budget: int) -> List[str]:
+    """1ターン分のツールの出力を、合計budget文字に収めて返す。
+    小さい出力はそのまま残し、余った分を大きい出力で均等に分け合います。
+    render()は省略の目印を含めて上限に収めるため、返す文字列の長さの合計はbudgetを超えません。
+    """
+    # 各出力を1件あたりの上限で描画したときの長さ（省略の目印を含む）から配分します。
+    sizes = [len(o.render()) for o in outputs]
+    limits = list(sizes)
+    if sum(sizes) > budget:
+        remaining = budget
+        order = sorted(range(len(outputs)), key=lambda i: sizes[i])
+        for position, index in enumerate(order):
+            share = remaining // (len(order) - position)
+            limits[index] = min(sizes[index], share)
+            remaining -= limits[index]
+    return [o.render(limit) for o, limit in zip(outputs, limits)]
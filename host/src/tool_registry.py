@@ -0,0 +1,122 @@
+# MCPサーバーのツールを、OpenAIに渡すツール名から直接引けるようにまとめる登録簿（レジストリ）です。
+# ツール名の変換と引数のJSONスキーマの準備は登録時に1回だけ行い、
+# ツール呼び出しのたびに名前を分解したり、スキーマを読み直したりしないようにします。
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from jsonschema import SchemaError
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+from mcp.types import Tool
+
+logger = logging.getLogger(__name__)
+
+# サーバー名とツール名を区切るための文字列を定義します。
+TOOL_SEPARATOR = "__"
+# OpenAIのツール名に使える文字と長さの上限です（^[a-zA-Z0-9_-]{1,64}$）。
+INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_-]")
+MAX_TOOL_NAME_LENGTH = 64
+# 名前が重なったときに、ハッシュを変えて作り直す回数の上限です。
+MAX_NAME_ATTEMPTS = 100
+
+
+class ToolArgumentError(ValueError):
+    """ツールの引数がJSONスキーマに合わないときに、MCPサーバーに送らずに失敗させる例外"""
+
+
+class UnknownToolError(LookupError):
+    """登録されていないツール名で呼び出されたときの例外"""
+
+
+@dataclass
+class ToolEntry:
+    """OpenAIのツール名1つに対応する、呼び出し先のサーバーとツールの情報"""
+
+    name: str # OpenAIに渡すツール名
+    server: Any # 呼び出し先のMCPServer（セッションは呼び出し時にserver.poolのレプリカから借ります）
+    tool: Tool # MCPのツール定義
+    openai_tool: dict # OpenAIのFunction Callingスキーマに変換したもの
+    validator: Any = None # 引数を検証するバリデーター（スキーマが不正な場合はNone）
+
+    def validate(self, args: Any) -> None:
+        """引数をスキーマで検証し、合わなければToolArgumentErrorを送出する。"""
+        if self.validator is None:
+            return
+        error = best_match(self.validator.iter_errors(args))
+        if error is not None:
+            path = "/".join(str(p) for p in error.absolute_path) or "(root)"
+            raise ToolArgumentError(f"ツール '{self.tool.name}' の引数が不正です（{path}）: {error.message}")
+
+
+def mangle_tool_name(server_name: str, tool_name: str, taken: Dict[str, Any]) -> str:
+    """サーバー名とツール名から、OpenAIに渡す一意なツール名を作る。
+    使えない文字は「_」に置き換え、64文字を超える場合や既に使われている名前と
+    重なる場合は、末尾に元の名前から作ったハッシュを付けて区別します。
+    """
+    name = INVALID_NAME_CHARS.sub("_", f"{server_name}{TOOL_SEPARATOR}{tool_name}")
+    if len(name) <= MAX_TOOL_NAME_LENGTH and name not in taken:
+        return name
+    # ハッシュを付けた名前も既に使われていれば、ハッシュの元に番号を加えて作り直します。
+    for attempt in range(MAX_NAME_ATTEMPTS):
+        source = f"{server_name}\0{tool_name}" + (f"\0{attempt}" if attempt else "")
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+        candidate = f"{name[: MAX_TOOL_NAME_LENGTH - len(digest) - 1]}_{digest}"
+        if candidate not in taken:
+            return candidate
+    raise ValueError(f"ツール '{server_name}/{tool_name}' に重ならない名前を付けられませんでした")
+
+
+def compile_validator(tool: Tool) -> Optional[Any]:
+    """ツールの入力スキーマを検証し、引数のバリデーターを作る。スキーマが不正ならNoneを返す。"""
+    schema = tool.inputSchema or {"type": "object"}
+    cls = validator_for(schema)
+    try:
+        cls.check_schema(schema)
+    except SchemaError as e:
+        logger.warning(f"Tool '{tool.name}' has an invalid input schema, skipping validation: {e.message}")
+        return None
+    return cls(schema)
+
+
+class ToolRegistry:
+    """OpenAIのツール名 → (サーバー, ツール) の対応表。
+    openai_toolsはOpenAIにそのまま渡すツールの一覧で、登録内容が変わるとその場で更新されます。
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, ToolEntry] = {}
+        self.openai_tools: List[dict] = []
+
+    def register(self, server: Any, tools: List[Tool]) -> None:
+        """サーバーのツールを登録する。同じサーバーのツールが登録済みなら置き換える。"""
+        self._entries = {
+            name: entry for name, entry in self._entries.items() if entry.server is not server
+        }
+        for tool in tools:
+            name = mangle_tool_name(server.name, tool.name, self._entries)
+            self._entries[name] = ToolEntry(
+                name=name,
+                server=server,
+                tool=tool,
+                openai_tool={
+                    "type": "function",
+                    "name": name, # OpenAIに渡すツール名
+                    "description": tool.description, # ツールの説明（LLMがいつ使うべきかを判断するのに役立ちます）
+                    "parameters": tool.inputSchema, # ツールの入力パラメータのスキーマ
+                },
+                validator=compile_validator(tool),
+            )
+        self.openai_tools[:] = [entry.openai_tool for entry in self._entries.values()]
+
+    def lookup(self, name: str) -> ToolEntry:
+        """OpenAIのツール名から登録内容を返す。登録されていなければUnknownToolErrorを送出する。"""
+        entry = self._entries.get(name)
+        if entry is None:
+            raise UnknownToolError(f"ツール '{name}' は登録されていません")
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
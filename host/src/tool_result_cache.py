@@ -0,0 +1,131 @@
+# ツールの実行結果をホスト側でキャッシュするためのモジュールです。
+# 会話の中で同じURLのfetchや同じ検索が何度も呼ばれることがあるため、
+# (サーバー名, ツール名, 正規化した引数) をキーに結果を保存し、有効期限内ならMCPサーバーを呼ばずに返します。
+# 全体のバイト数に上限を設け、超えたら最も長く使われていない結果から捨てます（LRU）。
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from mcp.types import Tool
+
+from tool_output import ToolOutput
+
+CacheKey = Tuple[str, str, str]
+
+
+@dataclass
+class CachePolicy:
+    """ツールごとのキャッシュの方針"""
+
+    ttl: float = 300.0 # 結果を使い回す秒数（0以下ならキャッシュしない）
+    max_bytes: int = 1_000_000 # これより大きい結果はキャッシュしない
+    enabled: bool = True # Falseなら常にMCPサーバーを呼び出す（副作用のあるツール向け）
+
+    @property
+    def cacheable(self) -> bool:
+        return self.enabled and self.ttl > 0 and self.max_bytes > 0
+
+
+# キャッシュしないことを表す方針
+NEVER_CACHE = CachePolicy(enabled=False)
+
+
+def resolve_policy(
+    tool: Tool, configured: Optional[CachePolicy], default: CachePolicy
+) -> CachePolicy:
+    """ツールに適用する方針を決める。
+    設定で指定されていればそれを使い、なければツールのアノテーションで
+    読み取り専用でない（readOnlyHint=False）か破壊的（destructiveHint=True）とされたツールはキャッシュしません。
+    """
+    if configured is not None:
+        return configured
+    hints = tool.annotations
+    if hints is not None and (hints.readOnlyHint is False or hints.destructiveHint):
+        return NEVER_CACHE
+    return default
+
+
+def canonical_args(args: Any) -> str:
+    """キーの順番や空白の違いで別のキーにならないように、引数を正規化したJSONにする。"""
+    return json.dumps(args, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def cache_key(server: str, tool: str, args: Any) -> CacheKey:
+    return (server, tool, canonical_args(args))
+
+
+# この引数がtrueの呼び出しは、最新の結果を求めているものとしてキャッシュを使いません
+BYPASS_ARGUMENT = "bypass_cache"
+
+
+def requests_bypass(args: Any) -> bool:
+    """引数でキャッシュを使わないように求められているか（google_searchのbypass_cacheなど）"""
+    return isinstance(args, dict) and args.get(BYPASS_ARGUMENT) is True
+
+
+@dataclass
+class _Entry:
+    output: ToolOutput
+    size: int # 結果のバイト数（UTF-8）
+    expires_at: float
+
+
+class ToolResultCache:
+    """ツールの実行結果のLRUキャッシュ。合計max_bytesバイトを超えたら古いものから捨てます。"""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.bytes = 0 # 保存している結果の合計バイト数
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_saved = 0 # キャッシュから返した結果の合計バイト数
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+
+    def _remove(self, key: CacheKey) -> None:
+        self.bytes -= self._entries.pop(key).size
+
+    def get(self, key: CacheKey) -> Optional[ToolOutput]:
+        """有効期限内の結果があれば返す。"""
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += entry.size
+        return entry.output
+
+    def put(self, key: CacheKey, output: ToolOutput, policy: CachePolicy) -> bool:
+        """結果を保存する。方針の上限を超えるなどで保存しなかった場合はFalseを返す。"""
+        size = len(output.render().encode("utf-8"))
+        if not policy.cacheable or size > min(policy.max_bytes, self.max_bytes):
+            return False
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(output, size, time.monotonic() + policy.ttl)
+        self.bytes += size
+        self.stores += 1
+        # 合計の上限を超えた分は、最も長く使われていない結果から捨てます。
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "bytes_saved": self.bytes_saved,
+        }
@@ -0,0 +1,172 @@
+# 処理の段階ごとの所要時間（スパン）を記録するためのモジュールです。
+# スパンはOpenTelemetryと同じ形式のID（32桁のtrace_idと16桁のspan_id）を持ち、
+# 1回のユーザーの発言からLLMの呼び出し・ツール呼び出し・MCPサーバー内の処理までを
+# 同じtrace_idでたどれるように、親子関係をcontextvarsで引き継ぎます。
+# MCPサーバーにはW3C Trace Contextのtraceparent形式でIDを渡します。
+# 記録したスパンはJSONL（1行に1スパン）でファイルに書き出し、終了時に段階ごとのp50/p95/p99を集計します。
+# servers/src/tracing.pyはこのファイルのコピーです（ホストとサーバーは別のプロジェクトのため）。
+# 冒頭のコメント以外を変更したときは、両方を同じ内容にそろえてください（tests/test_tracing_copy.pyで確認します）。
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+
+@dataclass
+class Span:
+    """処理1つ分の記録"""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_ns: int = 0
+    end_ns: int = 0
+    status: str = "OK"
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        """W3C Trace Contextのtraceparentヘッダーの値"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes: Any) -> None:
+        """属性を追加する。"""
+        self.attributes.update(attributes)
+
+    def to_record(self, service: str) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+            "resource": {"service.name": service},
+        }
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple]:
+    """traceparentの値から (trace_id, span_id) を取り出す。形式が正しくなければNoneを返す。"""
+    if not value:
+        return None
+    parts = value.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+class Tracer:
+    """スパンを記録し、JSONLファイルへの書き出しと段階ごとの集計を行う。
+    pathが空なら何も記録しません（span()はそのまま処理を実行するだけになります）。
+    """
+
+    def __init__(self, service: str, path: Optional[str] = None) -> None:
+        self.service = service
+        self.path = path or None
+        self.enabled = self.path is not None
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+            f"{service}_span", default=None
+        )
+        self._durations: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock() # ワーカースレッドからも記録できるようにします
+        self._file = None
+
+    @property
+    def current(self) -> Optional[Span]:
+        return self._current.get()
+
+    def traceparent(self) -> Optional[str]:
+        """実行中のスパンのtraceparentを返す（MCPサーバーに渡すために使います）。"""
+        span = self._current.get()
+        return span.traceparent if span is not None else None
+
+    @contextmanager
+    def span(
+        self, name: str, traceparent: Optional[str] = None, **attributes: Any
+    ) -> Iterator[Optional[Span]]:
+        """withで囲んだ処理をスパンとして記録する。
+        実行中のスパンがあればその子に、traceparentが渡されればそのスパンの子になります。
+        """
+        if not self.enabled:
+            yield None
+            return
+        parent = self._current.get()
+        remote = parse_traceparent(traceparent)
+        if remote is not None:
+            trace_id, parent_id = remote
+        elif parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+        span = Span(name, trace_id, secrets.token_hex(8), parent_id, attributes)
+        token = self._current.set(span)
+        span.start_ns = time.time_ns()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "ERROR"
+            span.attributes.setdefault("error", repr(e))
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            self._current.reset(token)
+            self._record(span)
+
+    def _record(self, span: Span) -> None:
+        line = json.dumps(span.to_record(self.service), ensure_ascii=False, default=str)
+        with self._lock:
+            self._durations[span.name].append(span.duration_ms)
+            if self._file is None:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """段階（スパン名）ごとの件数とp50/p95/p99（ミリ秒）を返す。"""
+        with self._lock:
+            durations = {name: list(values) for name, values in self._durations.items()}
+        return {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.5), 1),
+                "p95_ms": round(percentile(values, 0.95), 1),
+                "p99_ms": round(percentile(values, 0.99), 1),
+            }
+            for name, values in sorted(durations.items())
+        }
+
+    def format_summary(self) -> str:
+        """summary()を表の形の文字列にする。"""
+        lines = [f"{'stage':<28} {'count':>6} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}"]
+        for name, s in self.summary().items():
+            lines.append(
+                f"{name:<28} {s['count']:>6} {s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9}"
+            )
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,88 @@
+"""検索クライアント再利用のマイクロベンチマーク。
+
+ローカルの代替サーバー（fake_search_backend.py）に対して、
+呼び出しごとにbuild()する従来の方式と、共有クライアント（SearchClient）を
+使う方式の1回あたりの所要時間を比較する。
+あわせて、応答遅延のある代替サーバーに対して同時に検索を投げたときに
+ワーカープールで並行実行されているか（N件の所要時間≒1件分か）を確認する。
+
+実行方法:
+    uv run bench_search_client.py --calls 200 --concurrent 8 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from googleapiclient.discovery import build
+
+from fake_search_backend import FakeSearchBackend
+
+
+def bench_build_per_call(calls: int, endpoint: str) -> float:
+    """変更前：呼び出しのたびにクライアントを生成する"""
+    start = time.perf_counter()
+    for i in range(calls):
+        service = build(
+            "customsearch",
+            "v1",
+            developerKey="dummy-key",
+            cache_discovery=False,
+            client_options={"api_endpoint": endpoint},
+        )
+        service.cse().list(q=f"query {i}", cx="dummy-cx", num=5).execute()
+    return time.perf_counter() - start
+
+
+def bench_shared_client(calls: int) -> float:
+    """変更後：共有クライアントを使い回す"""
+    from server_google_search import SearchClient
+
+    client = SearchClient()
+    start = time.perf_counter()
+    for i in range(calls):
+        client.search(q=f"query {i}", num=5)
+    return time.perf_counter() - start
+
+
+async def bench_concurrent(concurrent: int) -> float:
+    """ワーカープール経由でconcurrent件の検索を同時に実行する"""
+    from server_google_search import SearchClient
+
+    client = SearchClient(max_workers=concurrent)
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(client.asearch(q=f"query {i}", num=5) for i in range(concurrent))
+    )
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="検索クライアント再利用のベンチマーク")
+    parser.add_argument("--calls", type=int, default=200, help="検索の呼び出し回数")
+    parser.add_argument("--concurrent", type=int, default=8, help="同時に実行する検索の件数")
+    parser.add_argument("--latency", type=float, default=0.2, help="同時実行時の代替サーバーの応答遅延（秒）")
+    args = parser.parse_args()
+
+    os.environ["GOOGLE_CSE_API_KEY"] = "dummy-key"
+    os.environ["GOOGLE_CSE_ID"] = "dummy-cx"
+
+    with FakeSearchBackend() as backend:
+        os.environ["GOOGLE_CSE_ENDPOINT"] = backend.url
+        before = bench_build_per_call(args.calls, backend.url)
+        after = bench_shared_client(args.calls)
+
+    print(f"calls: {args.calls}")
+    print(f"build per call : {before / args.calls * 1000:.3f} ms/call")
+    print(f"shared client  : {after / args.calls * 1000:.3f} ms/call")
+    print(f"speedup        : {before / after:.1f}x")
+
+    with FakeSearchBackend(latency=args.latency) as backend:
+        os.environ["GOOGLE_CSE_ENDPOINT"] = backend.url
+        elapsed = asyncio.run(bench_concurrent(args.concurrent))
+
+    print(f"concurrent     : {args.concurrent} searches in {elapsed:.3f} s (latency {args.latency} s/search)")
+
+
+if __name__ == "__main__":
+    main()
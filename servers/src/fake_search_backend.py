@@ -0,0 +1,142 @@
+"""Custom Search APIのローカル代替サーバー（ベンチマーク・負荷試験用）。
+
+本物のAPIを使わずに計測できるよう、/customsearch/v1 へのGETに
+それらしい検索結果のJSONを返す。応答遅延は latency 秒で調整でき、
+status を200以外にするとそのステータスのエラー応答を返す（status=403, reason="dailyLimitExceeded"で
+1日の上限超過を、reason="rateLimitExceeded"で1分あたりの上限超過を再現できる）。
+
+単体で起動する場合:
+    uv run fake_search_backend.py --port 8765 --latency 0.2
+サーバー側は GOOGLE_CSE_ENDPOINT=http://127.0.0.1:8765/ を設定すると接続先が切り替わる。
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_items(query: str, num: int, start: int = 1) -> list[dict]:
+    """クエリから決まった内容の検索結果を組み立てる"""
+    items = []
+    for i in range(start, start + num):
+        items.append(
+            {
+                "title": f"{query} - 結果{i}",
+                "snippet": f"{query} に関する説明文 {i}",
+                "link": f"https://example.com/{i}?q={query}",
+                "displayLink": "example.com",
+                "pagemap": {"metatags": [{"article:published_time": "2025-01-01T00:00:00Z"}]},
+            }
+        )
+    return items
+
+
+class FakeSearchBackend:
+    """別スレッドで動くCustom Search APIの代替サーバー"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        status: int = 200,
+        reason: str = "",
+    ) -> None:
+        self.latency = latency
+        self.status = status
+        self.reason = reason  # エラー応答のerrors[].reason
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-Aliveを有効にする
+            disable_nagle_algorithm = True  # 小さな応答がNagleで遅延しないようにする
+
+            def do_GET(self) -> None:
+                with backend._count_lock:
+                    backend.request_count += 1
+                if backend.latency:
+                    time.sleep(backend.latency)
+
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if not url.path.rstrip("/").endswith("customsearch/v1"):
+                    self._reply(404, {"error": {"code": 404, "message": "not found"}})
+                    return
+                if backend.status != 200:
+                    error = {"code": backend.status, "message": "fake backend error"}
+                    if backend.reason:
+                        error["errors"] = [
+                            {"message": "fake backend error", "domain": "usageLimits", "reason": backend.reason}
+                        ]
+                    self._reply(backend.status, {"error": error})
+                    return
+                num = int(params.get("num", 10))
+                start = int(params.get("start", 1))
+                body = {
+                    "queries": {"request": [{"startIndex": start, "count": num}]},
+                    "items": make_items(params.get("q", ""), num, start),
+                }
+                if start + num <= 100:  # 本物のAPIと同じく100件目までページをたどれる
+                    body["queries"]["nextPage"] = [{"startIndex": start + num, "count": num}]
+                self._reply(200, body)
+
+            def _reply(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args) -> None:
+                pass  # 計測の邪魔になるのでアクセスログは出さない
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        """GOOGLE_CSE_ENDPOINT に設定するURL"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def serve_forever(self) -> None:
+        """現在のスレッドでリクエストを処理し続ける"""
+        self._httpd.serve_forever()
+
+    def start(self) -> "FakeSearchBackend":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeSearchBackend":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Custom Search APIのローカル代替サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="応答遅延（秒）")
+    parser.add_argument("--status", type=int, default=200, help="200以外ならそのステータスのエラーを返す")
+    parser.add_argument("--reason", default="", help="エラー応答のreason（dailyLimitExceededなど）")
+    args = parser.parse_args()
+
+    backend = FakeSearchBackend(args.host, args.port, args.latency, args.status, args.reason)
+    print(f"fake search backend: {backend.url}")
+    try:
+        backend.serve_forever()
+    except KeyboardInterrupt:
+        pass
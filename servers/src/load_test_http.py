@@ -0,0 +1,151 @@
+"""streamable-httpで起動したgoogle_search_serverの負荷試験。
+
+ローカルの代替サーバー（fake_search_backend.py）を検索APIとして、
+server_google_search.py をstreamable-httpモードで1つだけ起動し、
+複数のクライアント（ホストの代わり）から同時に検索を投げる。
+全てのクライアントが1つのプロセスの検索クライアント・キャッシュ・
+レートリミッターを共有していることを、終了時の統計（stats://cache, stats://quota）で確認できる。
+
+実行方法:
+    uv run load_test_http.py --clients 20 --requests 25 --queries 50 --latency 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+from fake_search_backend import FakeSearchBackend
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, backend_url: str) -> subprocess.Popen:
+    """検索サーバーをstreamable-httpモードで起動する"""
+    env = dict(
+        os.environ,
+        GOOGLE_SEARCH_TRANSPORT="streamable-http",
+        GOOGLE_SEARCH_PORT=str(port),
+        GOOGLE_CSE_API_KEY="dummy-key",
+        GOOGLE_CSE_ID="dummy-cx",
+        GOOGLE_CSE_ENDPOINT=backend_url,
+        GOOGLE_SEARCH_CACHE_PATH="",  # メモリ層のみ（前回の結果を使わない）
+        GOOGLE_SEARCH_QUOTA_PATH="",
+        GOOGLE_SEARCH_RATE="0",  # 負荷試験ではレート制限をかけない
+        GOOGLE_SEARCH_DAILY_LIMIT="1000000",
+    )
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_google_search.py")
+    return subprocess.Popen(
+        [sys.executable, script], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_until_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with streamablehttp_client(url) as (read, write, _):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def run_client(url: str, requests: int, queries: int, latencies: list, errors: list) -> None:
+    """1つのクライアント（ホスト）として接続し、requests回の検索を順番に行う"""
+    async with streamablehttp_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for _ in range(requests):
+                query = f"query {random.randrange(queries)}"
+                start = time.perf_counter()
+                try:
+                    result = await session.call_tool("google_search", {"query": query})
+                    if result.isError:
+                        errors.append(result.content[0].text)
+                except Exception as e:
+                    errors.append(repr(e))
+                latencies.append(time.perf_counter() - start)
+
+
+async def read_stats(url: str) -> dict:
+    async with streamablehttp_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            stats = {}
+            for name in ("cache", "singleflight", "quota"):
+                resource = await session.read_resource(f"stats://{name}")
+                stats[name] = json.loads(resource.contents[0].text)
+            return stats
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+async def load_test(url: str, clients: int, requests: int, queries: int) -> None:
+    latencies: list = []
+    errors: list = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(run_client(url, requests, queries, latencies, errors) for _ in range(clients))
+    )
+    elapsed = time.perf_counter() - start
+    stats = await read_stats(url)
+
+    print(f"clients        : {clients} x {requests} requests ({queries} distinct queries)")
+    print(f"elapsed        : {elapsed:.2f} s ({len(latencies) / elapsed:.1f} req/s)")
+    print(
+        f"latency        : p50 {percentile(latencies, 0.5) * 1000:.1f} ms / "
+        f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms / "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms / "
+        f"mean {statistics.mean(latencies) * 1000:.1f} ms"
+    )
+    print(f"errors         : {len(errors)}")
+    for error in errors[:5]:
+        print(f"  {error}")
+    # 全クライアントでキャッシュとクォータが共有されているので、
+    # APIへのリクエスト数（quota.used）は異なるクエリの数を超えない
+    print(f"cache          : hit rate {stats['cache']['hit_rate']} ({stats['cache']['hits']}/{stats['cache']['lookups']})")
+    print(f"singleflight   : {stats['singleflight']}")
+    print(f"quota used     : {stats['quota']['used']} API requests")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="streamable-httpモードの負荷試験")
+    parser.add_argument("--clients", type=int, default=20, help="同時に接続するクライアントの数")
+    parser.add_argument("--requests", type=int, default=25, help="クライアントごとの検索回数")
+    parser.add_argument("--queries", type=int, default=50, help="検索するクエリの種類の数")
+    parser.add_argument("--latency", type=float, default=0.1, help="代替サーバーの応答遅延（秒）")
+    args = parser.parse_args()
+
+    with FakeSearchBackend(latency=args.latency) as backend:
+        port = free_port()
+        server = start_server(port, backend.url)
+        url = f"http://127.0.0.1:{port}/mcp"
+        try:
+            asyncio.run(wait_until_ready(url))
+            asyncio.run(load_test(url, args.clients, args.requests, args.queries))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
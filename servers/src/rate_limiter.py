@@ -0,0 +1,241 @@
+"""google_search用のレートリミッターと1日あたりの利用回数（クォータ）の管理。
+
+Custom Search APIの無料枠は1日100クエリで、太平洋時間の0時にリセットされる。
+403エラーを受け取ってから気付くのではなく、事前に残り回数を数えておき、
+上限に達していれば待つか、リクエストせずにエラーを返す。
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def quota_timezone() -> tzinfo:
+    """クォータがリセットされる基準のタイムゾーン（太平洋時間）"""
+    try:
+        return ZoneInfo("America/Los_Angeles")
+    except ZoneInfoNotFoundError:
+        # タイムゾーンデータがない環境では太平洋標準時で近似する
+        return timezone(timedelta(hours=-8))
+
+
+class QuotaExhausted(Exception):
+    """1日の利用上限に達したため、リクエストを送らずに失敗させるときの例外"""
+
+
+class TokenBucket:
+    """1秒あたりの呼び出し回数をならすトークンバケット"""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate  # 1秒あたりに補充されるトークン数（0以下なら無制限）
+        self.burst = burst  # 一度に使えるトークンの最大数
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        if self.rate <= 0:
+            return float(self.burst)
+        self._refill()
+        return self._tokens
+
+    async def acquire(self) -> None:
+        """トークンを1つ取得する。足りなければ補充されるまで待つ（先着順）"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DailyBudget:
+    """1日あたりの利用回数をファイルに保存しながら数える。
+
+    ホストはサーバーのプロセスを複数起動することがあり、それらは同じファイルを共有する。
+    回数を変えるときはファイルをロックして保存されている回数を読み直し、それに足して書き込む。
+    """
+
+    def __init__(self, limit: int, path: str | None = None, tz: tzinfo | None = None) -> None:
+        self.limit = limit
+        self.path = path
+        self.tz = tz or quota_timezone()
+        self._period = self._current_period()
+        self.used = 0
+        self._sync()
+
+    def _current_period(self) -> str:
+        return datetime.now(self.tz).date().isoformat()
+
+    def _read_used(self) -> int:
+        """ファイルに保存されている今日の利用回数"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError):
+            return self.used  # 読めなければメモリ上の回数を使う
+        if data.get("period") != self._period:
+            return 0
+        return int(data.get("used", 0))
+
+    def _sync(self) -> None:
+        """日付が変わっていればリセットし、他のプロセスが数えた分も含めた回数を読み込む"""
+        period = self._current_period()
+        if period != self._period:
+            self._period = period
+            self.used = 0
+        if self.path:
+            self.used = self._read_used()
+
+    @contextmanager
+    def _locked(self):
+        """ファイルの回数を読み直してから書き込むまでの間、他のプロセスを待たせる"""
+        if not self.path:
+            yield
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        # 一時ファイルはプロセスごとに別の名前にし、書き終えてから置き換える
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path) or ".", prefix=f"{os.path.basename(self.path)}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"period": self._period, "used": self.used}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @property
+    def remaining(self) -> int:
+        self._sync()
+        return max(self.limit - self.used, 0)
+
+    def resets_at(self) -> datetime:
+        """次にクォータがリセットされる日時"""
+        now = datetime.now(self.tz)
+        tomorrow = now.date() + timedelta(days=1)
+        return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=self.tz)
+
+    def seconds_until_reset(self) -> float:
+        return max((self.resets_at() - datetime.now(self.tz)).total_seconds(), 0.0)
+
+    def try_consume(self) -> bool:
+        """残りがあれば1回分消費してTrueを返す"""
+        with self._locked():
+            self._sync()
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            self._save()
+        return True
+
+    def exhaust(self) -> None:
+        """APIから利用制限エラーが返ったとき、今日の残りを0にする"""
+        with self._locked():
+            self._sync()
+            self.used = max(self.used, self.limit)
+            self._save()
+
+
+class QuotaLimiter:
+    """トークンバケットと1日の利用上限を組み合わせたリミッター。
+
+    mode="fail" のときは上限に達した時点でQuotaExhaustedを送出し、
+    mode="queue" のときはリセットまで（最大queue_timeout秒）待つ。
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        budget: DailyBudget,
+        mode: str = "fail",
+        queue_timeout: float = 300,
+    ) -> None:
+        if mode not in ("fail", "queue"):
+            raise ValueError(f"Unknown quota mode: {mode}")
+        self.bucket = bucket
+        self.budget = budget
+        self.mode = mode
+        self.queue_timeout = queue_timeout
+        self.queue_depth = 0  # 待機中のリクエスト数
+        self.rejected = 0  # 上限のため送らずに失敗させた回数
+
+    def _exhausted_error(self) -> QuotaExhausted:
+        self.rejected += 1
+        resets_at = self.budget.resets_at().isoformat(timespec="minutes")
+        return QuotaExhausted(
+            f"Google検索APIの1日の利用上限（{self.budget.limit}回）に達しました。"
+            f"{resets_at}以降に再試行してください。"
+        )
+
+    async def acquire(self) -> None:
+        """1回分のリクエストの許可を得る"""
+        self.queue_depth += 1
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            while not self.budget.try_consume():
+                remaining = deadline - time.monotonic()
+                if self.mode != "queue" or remaining <= 0:
+                    raise self._exhausted_error()
+                # リセット時刻まで待つ（待ち時間の上限を超えないように区切る）
+                await asyncio.sleep(min(self.budget.seconds_until_reset() + 1, remaining, 60))
+            await self.bucket.acquire()
+        finally:
+            self.queue_depth -= 1
+
+    def stats(self) -> dict:
+        """残りの利用回数や待機中のリクエスト数を返す"""
+        remaining = self.budget.remaining  # 日付が変わっていればここでリセットされる
+        return {
+            "daily_limit": self.budget.limit,
+            "used": self.budget.used,
+            "remaining": remaining,
+            "resets_at": self.budget.resets_at().isoformat(),
+            "mode": self.mode,
+            "queue_depth": self.queue_depth,
+            "rejected": self.rejected,
+            "rate_per_second": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "tokens": round(self.bucket.tokens, 2),
+        }
@@ -0,0 +1,203 @@
+"""google_search用の2段キャッシュ（メモリ上のTTL付きLRU＋SQLiteのディスク層）。
+
+Custom Search APIは1日100クエリまでしか使えないため、同じ検索結果を
+セッション内・再起動後も使い回してクォータを節約する。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any
+
+
+def normalize_query(query: str) -> str:
+    """表記ゆれ（全角/半角・大文字/小文字・連続した空白）を吸収したクエリを返す"""
+    text = unicodedata.normalize("NFKC", query)
+    return " ".join(text.split()).casefold()
+
+
+def make_cache_key(query: str, num: int, gl: str, lr: str, start: int = 1) -> str:
+    """正規化した (query, num, gl, lr) とページの開始位置からキャッシュキーを作る"""
+    return json.dumps([normalize_query(query), num, gl, lr, start], ensure_ascii=False)
+
+
+class MemoryCache:
+    """TTL付きのLRUキャッシュ（第1層）"""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)  # 最近使ったものを末尾へ
+            return value
+
+    def set(self, key: str, value: Any, stored_at: float | None = None) -> None:
+        with self._lock:
+            self._data[key] = (stored_at or time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)  # 最も古いものから追い出す
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """SQLiteに保存するキャッシュ（第2層）。再起動後も残る"""
+
+    def __init__(self, path: str, max_entries: int, ttl: float) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache(accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> tuple[float, Any] | None:
+        """(保存時刻, 値) を返す。期限切れなら削除してNoneを返す"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if now - stored_at > self.ttl:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return stored_at, json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            # 上限を超えた分は最終アクセスが古いものから削除する
+            cursor = self._conn.execute(
+                """
+                DELETE FROM search_cache WHERE key IN (
+                    SELECT key FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self.evictions += cursor.rowcount
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+
+class SearchCache:
+    """メモリ層とディスク層をまとめた検索結果キャッシュ"""
+
+    def __init__(
+        self,
+        memory_size: int = 256,
+        memory_ttl: float = 3600,
+        disk_path: str | None = None,
+        disk_size: int = 10000,
+        disk_ttl: float = 86400,
+    ) -> None:
+        self.memory = MemoryCache(memory_size, memory_ttl)
+        self.disk = DiskCache(disk_path, disk_size, disk_ttl) if disk_path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                self.memory.set(key, value, stored_at)  # 次回はメモリから返す
+                self._count("disk_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> dict:
+        """ヒット/ミス数などの統計情報を返す"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "lookups": lookups,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory": {
+                "entries": len(self.memory),
+                "max_entries": self.memory.max_entries,
+                "ttl_seconds": self.memory.ttl,
+                "evictions": self.memory.evictions,
+            },
+            "disk": (
+                {
+                    "path": self.disk.path,
+                    "entries": len(self.disk),
+                    "max_entries": self.disk.max_entries,
+                    "ttl_seconds": self.disk.ttl,
+                    "evictions": self.disk.evictions,
+                }
+                if self.disk is not None
+                else None
+            ),
+        }
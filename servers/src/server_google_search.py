@@ -1,64 +1,306 @@
+import asyncio
+import base64
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, AsyncIterator, Awaitable, Callable
 from mcp.server.fastmcp import FastMCP, Context
+from mcp.types import CallToolResult, TextContent
+from pydantic import BaseModel
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+import json
 import os
+import sys
+import threading
+from rate_limiter import DailyBudget, QuotaExhausted, QuotaLimiter, TokenBucket
+from search_cache import SearchCache, make_cache_key, normalize_query
+from tracing import Tracer
 # .envファイルから環境変数を読み込む
 from dotenv import load_dotenv
 load_dotenv()  # .envファイルから環境変数を読み込み
 API_KEY = os.getenv("GOOGLE_CSE_API_KEY")  # Google Custom Search APIキー
 CX_ID = os.getenv("GOOGLE_CSE_ID")  # 検索エンジンID
+# 同時に実行できる検索の上限（ワーカースレッド数）
+MAX_CONCURRENT_SEARCHES = int(os.getenv("GOOGLE_SEARCH_MAX_CONCURRENCY", "8"))
+# 検索結果キャッシュの設定（ディスク層のパスを空にするとメモリ層のみになる）
+CACHE_PATH = os.getenv(
+    "GOOGLE_SEARCH_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "google_search.sqlite3"),
+)
+CACHE_SIZE = int(os.getenv("GOOGLE_SEARCH_CACHE_SIZE", "256"))  # メモリ層の最大件数
+CACHE_TTL = float(os.getenv("GOOGLE_SEARCH_CACHE_TTL", "3600"))  # メモリ層の有効期限（秒）
+CACHE_DISK_SIZE = int(os.getenv("GOOGLE_SEARCH_CACHE_DISK_SIZE", "10000"))  # ディスク層の最大件数
+CACHE_DISK_TTL = float(os.getenv("GOOGLE_SEARCH_CACHE_DISK_TTL", "86400"))  # ディスク層の有効期限（秒）
+# レート制限と1日の利用上限の設定
+RATE_PER_SECOND = float(os.getenv("GOOGLE_SEARCH_RATE", "1"))  # 1秒あたりの検索回数（0以下で無制限）
+RATE_BURST = int(os.getenv("GOOGLE_SEARCH_BURST", "5"))  # 瞬間的に許可する検索回数
+DAILY_LIMIT = int(os.getenv("GOOGLE_SEARCH_DAILY_LIMIT", "100"))  # 1日あたりの検索回数の上限
+QUOTA_PATH = os.getenv(
+    "GOOGLE_SEARCH_QUOTA_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "google_search_quota.json"),
+)
+# 上限に達したときの動作（fail: すぐにエラーを返す / queue: リセットまで待つ）
+QUOTA_MODE = os.getenv("GOOGLE_SEARCH_QUOTA_MODE", "fail")
+QUOTA_QUEUE_TIMEOUT = float(os.getenv("GOOGLE_SEARCH_QUEUE_TIMEOUT", "300"))  # queue時の最大待ち時間（秒）
+# 通信方式（stdio: ホストごとに起動する / streamable-http: 1つのプロセスを複数のホストで共有する）
+TRANSPORT = os.getenv("GOOGLE_SEARCH_TRANSPORT", "stdio")
+HTTP_HOST = os.getenv("GOOGLE_SEARCH_HOST", "127.0.0.1")  # streamable-http時の待ち受けアドレス
+HTTP_PORT = int(os.getenv("GOOGLE_SEARCH_PORT", "8000"))  # streamable-http時の待ち受けポート
+# streamable-http時にセッションを持たずにリクエストごとに処理するかどうか（複数台で負荷分散する場合など）
+HTTP_STATELESS = os.getenv("GOOGLE_SEARCH_STATELESS_HTTP", "false").lower() in {"1", "true", "yes"}
+# スパン（検索・API呼び出しの所要時間）を書き出すJSONLファイルのパス（空なら記録しない）
+TRACE_PATH = os.getenv("GOOGLE_SEARCH_TRACE_PATH", "")
 
-mcp = FastMCP("google_search_server")
 
+def current_api_key() -> str | None:
+    """現在のGoogle Custom Search APIキーを返す（実行中の変更にも追従する）"""
+    return os.getenv("GOOGLE_CSE_API_KEY", API_KEY)
 
-@mcp.tool()
-async def google_search(query: str, ctx: Context) -> str:
+
+def current_cx_id() -> str | None:
+    """現在の検索エンジンIDを返す"""
+    return os.getenv("GOOGLE_CSE_ID", CX_ID)
+
+
+def current_endpoint() -> str | None:
+    """APIの接続先を返す（未設定なら公式エンドポイント。ベンチマーク等で差し替え可能）"""
+    return os.getenv("GOOGLE_CSE_ENDPOINT") or None
+
+
+class SearchClient:
+    """Custom Search APIクライアントをプロセス全体で共有するためのホルダー。
+
+    build()によるクライアント生成（ディスカバリ文書の解析）は初回と
+    APIキー・接続先が変わったときだけ行う。httplib2.Httpはスレッドセーフでは
+    ないため、スレッドごとに1つ保持してKeep-Aliveで接続を再利用する。
+    ブロッキングする.execute()は専用のワーカープールで実行し、イベントループを止めない。
     """
-    指定されたクエリでGoogle検索を行い、最初の5件の結果を返します。
-    日本からの検索として扱い、日本語の結果を優先します。
 
-    Args:
-        query (str): 検索クエリ
-        ctx (Context): ロギング用のMCPコンテキスト
+    def __init__(self, max_workers: int = MAX_CONCURRENT_SEARCHES) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="google_search"
+        )
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._service = None
+        self._service_key: tuple[str | None, str | None] | None = None
+
+    def get_service(self):
+        """共有クライアントを返す。APIキーか接続先が変わっていれば作り直す"""
+        key = (current_api_key(), current_endpoint())
+        with self._lock:
+            if self._service is None or self._service_key != key:
+                api_key, endpoint = key
+                self._service = build(
+                    "customsearch",
+                    "v1",
+                    developerKey=api_key,
+                    cache_discovery=False,
+                    client_options={"api_endpoint": endpoint} if endpoint else None,
+                )
+                self._service_key = key
+            return self._service
+
+    def _http(self):
+        """このスレッド専用のHTTPクライアント（接続はKeep-Aliveで再利用される）"""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = build_http()
+            self._local.http = http
+        return http
+
+    def search(self, **params) -> dict:
+        """cse.listを実行してレスポンスの辞書を返す（ブロッキング呼び出し）"""
+        request = self.get_service().cse().list(cx=current_cx_id(), **params)
+        return request.execute(http=self._http())
+
+    async def asearch(self, **params) -> dict:
+        """search()をワーカープールで実行する。上限を超えた分は空きが出るまで待つ"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self.search, **params)
+        )
+
+
+class SingleFlight:
+    """同じキーの処理が実行中であれば新たに実行せず、その結果を待って共有する。
+
+    結果も例外も待っている全員に同じものが届く。上流の処理は独立したタスクで
+    動かすため、待っている呼び出しの1つがキャンセルされても他には影響しない。
     """
-    # 入力検証処理
 
-    # 検索クエリが空の場合、エラーを返す
-    if not query or not query.strip():
-        raise ValueError("検索クエリを入力してください")
+    def __init__(self) -> None:
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.leaders = 0  # 実際に上流へリクエストした回数
+        self.coalesced = 0  # 実行中の処理に相乗りした回数
 
-    # 検索クエリが長すぎる場合、エラーを返す
-    if len(query) > 100:
-        raise ValueError("検索クエリは100文字以内で入力してください")
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """相乗りできたリクエスト数などの統計情報を返す"""
+        total = self.leaders + self.coalesced
+        return {
+            "requests": total,
+            "upstream_requests": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+            "in_flight": len(self._inflight),
+        }
+
+
+# プロセス全体で共有する検索クライアント
+search_client = SearchClient()
+# 実行中の同一検索をまとめるためのSingleFlight
+search_flight = SingleFlight()
+# 検索APIの呼び出し回数を制限するリミッター
+quota_limiter = QuotaLimiter(
+    TokenBucket(RATE_PER_SECOND, RATE_BURST),
+    DailyBudget(DAILY_LIMIT, QUOTA_PATH or None),
+    mode=QUOTA_MODE,
+    queue_timeout=QUOTA_QUEUE_TIMEOUT,
+)
+# 検索とAPI呼び出しの所要時間を記録するトレーサー
+tracer = Tracer("google_search_server", TRACE_PATH)
+# プロセス全体で共有する検索結果キャッシュ
+search_cache = SearchCache(
+    memory_size=CACHE_SIZE,
+    memory_ttl=CACHE_TTL,
+    disk_path=CACHE_PATH or None,
+    disk_size=CACHE_DISK_SIZE,
+    disk_ttl=CACHE_DISK_TTL,
+)
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """サーバー起動時に検索クライアントを1度だけ生成しておく
+
+    streamable-httpでは接続（セッション）ごとに呼ばれるが、検索クライアント・キャッシュ・
+    レートリミッターはモジュール単位で1つなので、全ての接続で共有される。
+    """
+    if current_api_key():
+        search_client.get_service()
+    yield
+
+
+mcp = FastMCP(
+    "google_search_server",
+    lifespan=lifespan,
+    host=HTTP_HOST,
+    port=HTTP_PORT,
+    stateless_http=HTTP_STATELESS,
+)
+
+
+async def run_search(
+    query: str,
+    ctx: Context,
+    num: int = 5,
+    gl: str = "jp",
+    lr: str = "lang_ja",
+    start: int = 1,
+    bypass_cache: bool = False,
+) -> dict:
+    """キャッシュを確認し、なければCustom Search APIを呼び出してレスポンスを返す。
+    同じ検索が既に実行中の場合は、新たに呼び出さずにその結果を待つ。
+    bypass_cacheがTrueの場合は、キャッシュも実行中の検索も使わずに必ずAPIを呼び出す。
+    """
+    key = make_cache_key(query, num, gl, lr, start)
+    # ホストから渡されたtraceparentを親にして、検索全体の所要時間を記録する
+    with tracer.span("google_search.search", traceparent=request_traceparent(ctx), query=query) as span:
+        if bypass_cache:
+            # 最新の結果を求められているので、実行中の（より前に始まった）検索の結果も使わない
+            return await fetch_search(key, query, ctx, num=num, gl=gl, lr=lr, start=start)
+
+        cached = search_cache.get(key)
+        if cached is not None:
+            if span is not None:
+                span.set(cache_hit=True)
+            await ctx.info(f"キャッシュから検索結果を返します: '{query}'")
+            return cached
+
+        # 同じ検索が実行中なら、その結果を待って共有する（クォータの節約）
+        return await search_flight.do(
+            key, lambda: fetch_search(key, query, ctx, num=num, gl=gl, lr=lr, start=start)
+        )
+
+
+def request_traceparent(ctx: Context) -> str | None:
+    """ホストがtools/callの_metaで渡したtraceparentを返す（渡されていなければNone）"""
+    meta = ctx.request_context.meta
+    return getattr(meta, "traceparent", None) if meta is not None else None
+
+
+# 1日の利用上限に達したことを示すエラーの理由（これ以外の403/429では1日の利用回数を使い切った扱いにしない）
+DAILY_LIMIT_REASONS = {"dailyLimitExceeded", "quotaExceeded"}
+
+
+def http_error_reasons(e: HttpError) -> set[str]:
+    """Google APIのエラー応答からerrors[].reason（dailyLimitExceededなど）を取り出す"""
+    reasons = set()
+    if isinstance(e.error_details, list):
+        for detail in e.error_details:
+            if isinstance(detail, dict) and detail.get("reason"):
+                reasons.add(detail["reason"])
+    if not reasons:
+        # 形式が違う場合は、応答の本文に理由の文字列が含まれているかで判断する
+        content = e.content.decode("utf-8", errors="replace")
+        reasons = {reason for reason in DAILY_LIMIT_REASONS if reason in content}
+    return reasons
+
+
+async def fetch_search(
+    key: str, query: str, ctx: Context, num: int, gl: str, lr: str, start: int
+) -> dict:
+    """Custom Search APIを呼び出し、結果をキャッシュに保存して返す"""
+    # クォータの確認（上限に達していれば、確実に失敗するリクエストは送らない）
+    try:
+        await quota_limiter.acquire()
+    except QuotaExhausted as e:
+        await ctx.error("APIの利用上限に達しているため検索を中止しました")
+        raise e
 
-    # API設定の確認
-    if not API_KEY or not CX_ID:
-        raise Exception("Google検索APIが設定されていません。環境変数を確認してください。")
-    
     # 検索実行ログを残す（infoレベル）
     await ctx.info(f"Google検索を実行: '{query}'")
 
     # 検索実施
     try: # エラー処理のため、tryで囲む
-        # Google Custom Search APIの呼び出し
-        service = build("customsearch", "v1", developerKey=API_KEY)
-        resp = (
-            service.cse()
-            .list(
-                q=query,
-                cx=CX_ID,
-                num=5,  # 上位5件を返す
-                gl="jp",  # 日本からの検索
-                lr="lang_ja",  # 日本語優先
-            )
-            .execute()
-        )
+        # Google Custom Search APIの呼び出し（共有クライアントをワーカープールで実行する）
+        params = {"q": query, "num": num}
+        if start > 1:
+            params["start"] = start  # 2ページ目以降の開始位置
+        if gl:
+            params["gl"] = gl
+        if lr:
+            params["lr"] = lr
+        with tracer.span("google_search.cse_list", query=query, start=start):
+            resp = await search_client.asearch(**params)
 
     except HttpError as e:
         # Google APIのエラー処理
-        if e.resp.status == 403:
+        reasons = http_error_reasons(e)
+        if e.resp.status in (403, 429) and reasons & DAILY_LIMIT_REASONS:
+            quota_limiter.budget.exhaust()  # 今日はこれ以上リクエストしない
             await ctx.error("APIの利用制限エラー") # errorレベルでロギング
             raise Exception("Google検索APIの利用制限に達しました。1日100回までの制限を超えた可能性があります。")
+        elif e.resp.status in (403, 429):
+            # 1分あたりの上限やAPIキーの誤りなど。1日の利用回数には触れない
+            await ctx.error(f"APIの利用制限・権限エラー: {str(e)}")
+            raise Exception(
+                f"Google検索APIへのリクエストが拒否されました（{', '.join(sorted(reasons)) or e.resp.status}）。"
+                "しばらく待つか、APIキーと検索エンジンIDの設定を確認してください。"
+            )
         else:
             await ctx.error(f"APIエラー: {str(e)}")
             raise Exception("Google検索APIでエラーが発生しました。しばらく待ってから再試行してください。")
@@ -68,32 +310,293 @@ async def google_search(query: str, ctx: Context) -> str:
         await ctx.error(f"検索エラー: {str(e)}")
         raise Exception("検索中にエラーが発生しました。インターネット接続を確認してください。")
 
-    # 検索結果の処理
-    items = resp.get("items", [])
-    if not items:
-        return "検索結果が見つかりませんでした"
+    search_cache.set(key, resp)
+    return resp
+
+
+# google_search_manyで一度に受け付けるクエリ数の上限
+MAX_BATCH_QUERIES = 10
+# Custom Search APIで1回に取得できる件数の上限と、ページをたどって取得できる順位の上限
+MAX_RESULTS_PER_PAGE = 10
+MAX_RESULT_DEPTH = 100
+# google_searchで件数・国・言語を指定しなかったときの既定値
+DEFAULT_NUM = 5
+DEFAULT_GL = "jp"
+DEFAULT_LR = "lang_ja"
+
+
+class SearchResult(BaseModel):
+    """検索結果1件分"""
+
+    rank: int  # 検索順位
+    title: str  # ページタイトル
+    snippet: str  # 概要
+    url: str  # ページのURL
+    domain: str | None = None  # 表示用のドメイン
+    published_at: str | None = None  # 公開日時（存在しない場合はNone）
+
+
+class SearchResponse(BaseModel):
+    """google_searchの結果"""
+
+    query: str
+    results: list[SearchResult]
+    next_cursor: str | None = None  # 次のページを取得するためのカーソル（最後のページならNone）
+
 
+class BatchSearchItem(BaseModel):
+    """google_search_manyのクエリ1件分の結果（失敗した場合はerrorに理由が入る）"""
+
+    query: str
+    results: list[SearchResult] | None = None
+    error: str | None = None
+
+
+class BatchSearchResponse(BaseModel):
+    """google_search_manyの結果"""
+
+    results: list[BatchSearchItem]
+
+
+def to_tool_result(model: BaseModel, drop_nulls: bool) -> CallToolResult:
+    """構造化された結果と、それを空白なしのJSONにしたテキストをまとめて返す"""
+    data = model.model_dump(mode="json", exclude_none=drop_nulls)
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return CallToolResult(content=[TextContent(type="text", text=text)], structuredContent=data)
+
+
+def validate_query(query: str) -> None:
+    """検索クエリの入力検証（不正な場合はValueErrorを送出する）"""
+    # 検索クエリが空の場合、エラーを返す
+    if not query or not query.strip():
+        raise ValueError("検索クエリを入力してください")
+
+    # 検索クエリが長すぎる場合、エラーを返す
+    if len(query) > 100:
+        raise ValueError("検索クエリは100文字以内で入力してください")
+
+
+def validate_search_options(num: int, gl: str, lr: str) -> None:
+    """件数・国・言語の指定を検証する"""
+    if not 1 <= num <= MAX_RESULTS_PER_PAGE:
+        raise ValueError(f"取得件数は1〜{MAX_RESULTS_PER_PAGE}件で指定してください")
+    if gl and not (len(gl) == 2 and gl.isalpha()):
+        raise ValueError("glは2文字の国コード（例: jp, us）で指定してください")
+    if lr and not lr.startswith("lang_"):
+        raise ValueError("lrは言語コード（例: lang_ja, lang_en）で指定してください")
+
+
+def encode_cursor(query: str, num: int, gl: str, lr: str, start: int) -> str:
+    """次のページを取得するための情報をカーソル文字列にする"""
+    data = json.dumps([query, num, gl, lr, start], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int, str, str, int]:
+    """カーソル文字列から (query, num, gl, lr, start) を取り出す"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        query, num, gl, lr, start = json.loads(base64.urlsafe_b64decode(padded))
+        query, num, gl, lr, start = str(query), int(num), str(gl), str(lr), int(start)
+    except (ValueError, TypeError):
+        raise ValueError("cursorが不正です。前回の検索結果のnext_cursorをそのまま指定してください")
+    # 書き換えられたカーソルで、取得できない範囲をAPIに問い合わせてクォータを使わないようにする
+    if not 1 <= num <= MAX_RESULTS_PER_PAGE or not 1 <= start <= MAX_RESULT_DEPTH - num + 1:
+        raise ValueError("cursorが不正です。前回の検索結果のnext_cursorをそのまま指定してください")
+    return query, num, gl, lr, start
+
+
+def next_page_start(resp: dict, num: int, start: int) -> int | None:
+    """次のページの開始位置を返す（次のページがなければNone）"""
+    if "queries" in resp:
+        next_pages = resp["queries"].get("nextPage")
+        next_start = next_pages[0].get("startIndex") if next_pages else None
+    else:
+        # queriesがないレスポンスでは、ページが埋まっていれば続きがあるとみなす
+        next_start = start + num if len(resp.get("items", [])) >= num else None
+    if next_start is None or next_start + num - 1 > MAX_RESULT_DEPTH:
+        return None
+    return next_start
+
+
+def check_api_config() -> None:
+    """API設定の確認"""
+    if not current_api_key() or not current_cx_id():
+        raise Exception("Google検索APIが設定されていません。環境変数を確認してください。")
+
+
+def clean_items(resp: dict, start: int = 1) -> list[SearchResult]:
+    """APIのレスポンスから必要な項目だけを取り出して整理する"""
     cleaned = []
-    for rank, it in enumerate(items, 1): # 取得された検索結果を整理する
+    for rank, it in enumerate(resp.get("items", []), start): # 取得された検索結果を整理する
         meta = (it.get("pagemap", {}).get("metatags") or [{}])[0]
         published = meta.get("article:published_time") or meta.get("og:updated_time")
 
         cleaned.append(
-            {
-                "rank": rank,
-                "title": it["title"],
-                "snippet": it["snippet"],
-                "url": it["link"],
-                "domain": it.get("displayLink"),
-                "published_at": published,  # 公開日時（存在しない場合はNone）
-            }
+            SearchResult(
+                rank=rank,
+                title=it["title"],
+                snippet=it.get("snippet", ""),
+                url=it["link"],
+                domain=it.get("displayLink"),
+                published_at=published,  # 公開日時（存在しない場合はNone）
+            )
         )
+    return cleaned
+
+
+@mcp.tool()
+async def google_search(
+    query: str,
+    ctx: Context,
+    num: int | None = None,
+    gl: str | None = None,
+    lr: str | None = None,
+    cursor: str | None = None,
+    bypass_cache: bool = False,
+    drop_nulls: bool = True,
+) -> Annotated[CallToolResult, SearchResponse]:
+    """
+    指定されたクエリでGoogle検索を行い、上位の結果を返します（既定では5件）。
+    既定では日本からの検索として扱い、日本語の結果を優先します。
+    さらに続きの結果が必要な場合は、返されたnext_cursorをcursorに指定して
+    同じクエリで呼び出すと次のページを取得できます（最大100位まで）。
+
+    Args:
+        query (str): 検索クエリ
+        ctx (Context): ロギング用のMCPコンテキスト
+        num (int | None): 1ページあたりの取得件数（1〜10、省略時は5）
+        gl (str | None): 検索する国の2文字コード（例: jp, us、省略時はjp）。空文字で指定なし
+        lr (str | None): 優先する言語（例: lang_ja, lang_en、省略時はlang_ja）。空文字で指定なし
+        cursor (str | None): 次のページを取得する場合に、前回のnext_cursorを指定する
+            （件数・国・言語はカーソルの条件を使うため、違う値を同時に指定するとエラー）
+        bypass_cache (bool): Trueの場合はキャッシュを使わずに最新の結果を取得する
+        drop_nulls (bool): Trueの場合は値のない項目（公開日時など）を結果から省く
+    """
+    # 入力検証処理
+    validate_query(query)
+    start = 1
+    if cursor:
+        # カーソルに保存された条件で続きのページを取得する
+        cursor_query, cursor_num, cursor_gl, cursor_lr, start = decode_cursor(cursor)
+        if normalize_query(cursor_query) != normalize_query(query):
+            raise ValueError("cursorは同じクエリの検索結果で返されたものを指定してください")
+        for option, value, saved in (("num", num, cursor_num), ("gl", gl, cursor_gl), ("lr", lr, cursor_lr)):
+            if value is not None and value != saved:
+                raise ValueError(f"{option}はcursorの検索条件（{saved!r}）と違う値を指定できません")
+        num, gl, lr = cursor_num, cursor_gl, cursor_lr
+    else:
+        num = DEFAULT_NUM if num is None else num
+        gl = DEFAULT_GL if gl is None else gl
+        lr = DEFAULT_LR if lr is None else lr
+    validate_search_options(num, gl, lr)
+    check_api_config()
+
+    # 取得済みのページはキャッシュ（メモリ）から返され、APIは呼び出されない
+    resp = await run_search(
+        query, ctx, num=num, gl=gl, lr=lr, start=start, bypass_cache=bypass_cache
+    )
+
+    # 検索結果の処理
+    cleaned = clean_items(resp, start)
+    next_start = next_page_start(resp, num, start)
+    next_cursor = encode_cursor(query, num, gl, lr, next_start) if next_start else None
 
     # 検索結果についてもログを残す
-    await ctx.info(f"検索完了: {len(cleaned)}件の結果")
+    await ctx.info(f"検索完了: {len(cleaned)}件の結果（{start}位から）")
+
+    return to_tool_result(
+        SearchResponse(query=query, results=cleaned, next_cursor=next_cursor), drop_nulls
+    )
+
+
+@mcp.tool()
+async def google_search_many(
+    queries: list[str],
+    ctx: Context,
+    num: int = DEFAULT_NUM,
+    gl: str = DEFAULT_GL,
+    lr: str = DEFAULT_LR,
+    bypass_cache: bool = False,
+    drop_nulls: bool = True,
+) -> Annotated[CallToolResult, BatchSearchResponse]:
+    """
+    複数のクエリでGoogle検索をまとめて行い、クエリごとに上位の結果を返します（既定では5件）。
+    関連する複数の検索を1回の呼び出しで済ませたいときに使います。
+    既定では日本からの検索として扱い、日本語の結果を優先します。
+
+    Args:
+        queries (list[str]): 検索クエリのリスト（最大10件。重複は1回だけ検索し、結果は入力と同じ順番でクエリごとに返す）
+        ctx (Context): ロギング用のMCPコンテキスト
+        num (int): クエリごとの取得件数（1〜10）
+        gl (str): 検索する国の2文字コード（例: jp, us）。空文字で指定なし
+        lr (str): 優先する言語（例: lang_ja, lang_en）。空文字で指定なし
+        bypass_cache (bool): Trueの場合はキャッシュを使わずに最新の結果を取得する
+        drop_nulls (bool): Trueの場合は値のない項目（公開日時など）を結果から省く
+    """
+    # 入力検証処理
+    if not queries:
+        raise ValueError("検索クエリを1件以上入力してください")
+    validate_search_options(num, gl, lr)
+    check_api_config()
+
+    # 表記ゆれを含めて重複したクエリは1回だけ検索する（順序は保つ）
+    unique: dict[str, str] = {}
+    for query in queries:
+        unique.setdefault(normalize_query(query), query)
+    if len(unique) > MAX_BATCH_QUERIES:
+        raise ValueError(f"検索クエリは一度に{MAX_BATCH_QUERIES}件までにしてください")
+
+    async def search_one(query: str) -> BatchSearchItem:
+        validate_query(query)
+        resp = await run_search(
+            query, ctx, num=num, gl=gl, lr=lr, bypass_cache=bypass_cache
+        )
+        return BatchSearchItem(query=query, results=clean_items(resp))
+
+    await ctx.info(f"Google検索をまとめて実行: {len(unique)}件")
+    # 全てのクエリを並行して検索し、失敗したものはクエリごとのエラーとして返す
+    outcomes = await asyncio.gather(
+        *(search_one(query) for query in unique.values()), return_exceptions=True
+    )
+    by_key = dict(zip(unique, outcomes))
+    # 結果は入力のクエリごとに、入力と同じ順番・同じ文字列で返す（重複したクエリは同じ検索結果を共有する）
+    results = []
+    for query in queries:
+        outcome = by_key[normalize_query(query)]
+        if isinstance(outcome, Exception):
+            results.append(BatchSearchItem(query=query, error=str(outcome)))
+        else:
+            results.append(BatchSearchItem(query=query, results=outcome.results))
+
+    errors = sum(1 for r in results if r.error is not None)
+    await ctx.info(f"まとめて検索完了: 成功{len(results) - errors}件 / 失敗{errors}件")
+
+    return to_tool_result(BatchSearchResponse(results=results), drop_nulls)
+
+
+@mcp.resource("stats://cache", mime_type="application/json")
+def get_cache_stats() -> str:
+    """検索結果キャッシュのヒット/ミス数などの統計情報"""
+    return json.dumps(search_cache.stats(), ensure_ascii=False)
+
+
+@mcp.resource("stats://singleflight", mime_type="application/json")
+def get_singleflight_stats() -> str:
+    """実行中の同一検索に相乗りしたリクエスト数（節約できたクォータ）"""
+    return json.dumps(search_flight.stats(), ensure_ascii=False)
+
 
-    return str(cleaned)
+@mcp.resource("stats://quota", mime_type="application/json")
+def get_quota_stats() -> str:
+    """本日の残り検索回数・リセット時刻・待機中のリクエスト数"""
+    return json.dumps(quota_limiter.stats(), ensure_ascii=False)
 
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    # streamable-httpの場合は http://<HTTP_HOST>:<HTTP_PORT>/mcp で待ち受ける
+    mcp.run(transport=TRANSPORT)
+    # 終了時に段階ごとの所要時間を出力する（stdioでは標準出力を通信に使うため標準エラー出力へ）
+    if tracer.enabled:
+        print(tracer.format_summary(), file=sys.stderr)
+        tracer.close()
@@ -0,0 +1,49 @@
+import os
+
+# server_google_searchを読み込む前に、開発者のキャッシュやクォータのファイルを使わないようにする
+os.environ["GOOGLE_SEARCH_CACHE_PATH"] = ""
+os.environ["GOOGLE_SEARCH_QUOTA_PATH"] = ""
+os.environ["GOOGLE_SEARCH_TRACE_PATH"] = ""
+
+from types import SimpleNamespace
+
+import pytest
+
+import server_google_search as server
+from fake_search_backend import FakeSearchBackend
+from rate_limiter import DailyBudget, QuotaLimiter, TokenBucket
+from search_cache import SearchCache
+
+
+class FakeContext:
+    """ツール関数に渡すContextの代わり（ログは記録するだけ）"""
+
+    def __init__(self) -> None:
+        self.request_context = SimpleNamespace(meta=None)
+        self.messages: list[tuple[str, str]] = []
+
+    async def info(self, message: str) -> None:
+        self.messages.append(("info", message))
+
+    async def error(self, message: str) -> None:
+        self.messages.append(("error", message))
+
+
+@pytest.fixture
+def ctx() -> FakeContext:
+    return FakeContext()
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Custom Search APIの代わりにFakeSearchBackendを使い、サーバーの共有状態を作り直す"""
+    with FakeSearchBackend() as fake:
+        monkeypatch.setenv("GOOGLE_CSE_API_KEY", "test-key")
+        monkeypatch.setenv("GOOGLE_CSE_ID", "test-cx")
+        monkeypatch.setenv("GOOGLE_CSE_ENDPOINT", fake.url)
+        monkeypatch.setattr(server, "search_cache", SearchCache())
+        monkeypatch.setattr(server, "search_flight", server.SingleFlight())
+        monkeypatch.setattr(
+            server, "quota_limiter", QuotaLimiter(TokenBucket(0, 1), DailyBudget(1000))
+        )
+        yield fake
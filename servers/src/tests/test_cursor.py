@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from server_google_search import MAX_RESULT_DEPTH, decode_cursor, encode_cursor, google_search
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("MCP サーバー", 10, "us", "lang_en", 11)
+    assert decode_cursor(cursor) == ("MCP サーバー", 10, "us", "lang_en", 11)
+
+
+@pytest.mark.parametrize(
+    "num, start",
+    [(5, 0), (5, -4), (5, MAX_RESULT_DEPTH), (10, MAX_RESULT_DEPTH - 8), (0, 1), (11, 1)],
+)
+def test_cursor_out_of_range_is_rejected(num, start):
+    with pytest.raises(ValueError, match="cursor"):
+        decode_cursor(encode_cursor("mcp", num, "jp", "lang_ja", start))
+
+
+def test_last_page_cursor_is_accepted():
+    assert decode_cursor(encode_cursor("mcp", 10, "jp", "lang_ja", MAX_RESULT_DEPTH - 9))[4] == 91
+
+
+def test_garbage_cursor_is_rejected():
+    with pytest.raises(ValueError, match="cursor"):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.parametrize("option", [{"num": 3}, {"gl": "us"}, {"lr": "lang_en"}])
+def test_explicit_option_conflicting_with_cursor_is_rejected(option):
+    cursor = encode_cursor("mcp", 5, "jp", "lang_ja", 6)
+    with pytest.raises(ValueError, match="cursor"):
+        asyncio.run(google_search("mcp", None, cursor=cursor, **option))
+
+
+def test_next_cursor_walks_pages_and_stops_at_depth(backend, ctx):
+    async def search(cursor=None):
+        result = await google_search("mcp", ctx, num=10, cursor=cursor)
+        return result.structuredContent
+
+    async def main():
+        pages = [await search()]
+        while pages[-1].get("next_cursor"):
+            pages.append(await search(pages[-1]["next_cursor"]))
+        again = await search(pages[0]["next_cursor"])
+        return pages, again
+
+    pages, again = asyncio.run(main())
+    ranks = [r["rank"] for page in pages for r in page["results"]]
+    assert ranks == list(range(1, MAX_RESULT_DEPTH + 1))
+    assert len(pages) == MAX_RESULT_DEPTH // 10
+    # 取得済みのページはキャッシュから返され、APIは呼ばれない
+    assert again == pages[1]
+    assert backend.request_count == len(pages)
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import server_google_search as server
+from rate_limiter import DailyBudget, QuotaExhausted, QuotaLimiter, TokenBucket
+
+
+def test_two_budgets_share_one_file(tmp_path):
+    path = str(tmp_path / "quota.json")
+    first = DailyBudget(5, path)
+    second = DailyBudget(5, path)
+    results = [budget.try_consume() for budget in (first, second, first, second, first, second, first)]
+    assert results == [True] * 5 + [False] * 2
+    assert first.remaining == second.remaining == 0
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["used"] == 5
+
+
+def test_concurrent_consumers_never_exceed_limit(tmp_path):
+    path = str(tmp_path / "quota.json")
+    budgets = [DailyBudget(50, path) for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda i: budgets[i % 4].try_consume(), range(80)))
+    assert results.count(True) == 50
+    assert DailyBudget(50, path).used == 50
+    assert not [name for name in tmp_path.iterdir() if name.suffix == ".tmp"]
+
+
+def test_exhaust_is_seen_by_other_instances(tmp_path):
+    path = str(tmp_path / "quota.json")
+    first = DailyBudget(10, path)
+    second = DailyBudget(10, path)
+    assert second.try_consume()
+    first.exhaust()
+    assert not second.try_consume()
+    assert second.remaining == 0
+
+
+def test_budget_without_file_counts_in_memory():
+    budget = DailyBudget(2)
+    assert budget.try_consume() and budget.try_consume()
+    assert not budget.try_consume()
+
+
+def test_token_bucket_allows_burst_then_paces():
+    async def main():
+        bucket = TokenBucket(rate=20, burst=3)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        burst_elapsed = time.monotonic() - started
+        for _ in range(2):
+            await bucket.acquire()
+        return burst_elapsed, time.monotonic() - started
+
+    burst_elapsed, total_elapsed = asyncio.run(main())
+    assert burst_elapsed < 0.05
+    assert total_elapsed >= 0.09  # 残りの2回は1/20秒ずつ待つ
+
+
+def test_limiter_fails_fast_when_budget_is_used_up():
+    limiter = QuotaLimiter(TokenBucket(0, 1), DailyBudget(1), mode="fail")
+
+    async def main():
+        await limiter.acquire()
+        with pytest.raises(QuotaExhausted):
+            await limiter.acquire()
+
+    asyncio.run(main())
+    stats = limiter.stats()
+    assert (stats["used"], stats["remaining"], stats["rejected"], stats["queue_depth"]) == (1, 0, 1, 0)
+
+
+def test_limiter_queue_mode_gives_up_after_timeout():
+    limiter = QuotaLimiter(TokenBucket(0, 1), DailyBudget(0), mode="queue", queue_timeout=0.05)
+    with pytest.raises(QuotaExhausted):
+        asyncio.run(limiter.acquire())
+
+
+@pytest.mark.parametrize(
+    "reason, used",
+    [("dailyLimitExceeded", 1000), ("quotaExceeded", 1000), ("rateLimitExceeded", 1), ("", 1)],
+)
+def test_only_daily_limit_errors_exhaust_the_budget(backend, ctx, reason, used):
+    backend.status = 403
+    backend.reason = reason
+    with pytest.raises(Exception, match="Google検索API"):
+        asyncio.run(server.run_search("mcp", ctx))
+    assert server.quota_limiter.budget.used == used
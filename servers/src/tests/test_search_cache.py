@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import server_google_search as server
+from search_cache import MemoryCache, SearchCache, make_cache_key
+
+
+def test_cache_key_absorbs_query_variations():
+    assert make_cache_key("ＭＣＰ  Server", 5, "jp", "lang_ja") == make_cache_key("mcp server", 5, "jp", "lang_ja")
+    assert make_cache_key("mcp", 5, "jp", "lang_ja", 6) != make_cache_key("mcp", 5, "jp", "lang_ja")
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # aを最近使ったものにする
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_memory_cache_expires_entries():
+    cache = MemoryCache(max_entries=10, ttl=60)
+    cache.set("old", 1, stored_at=time.time() - 61)
+    assert cache.get("old") is None
+    assert len(cache) == 0
+
+
+def test_disk_layer_survives_restart_and_refills_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SearchCache(disk_path=path).set("k", {"items": [1]})
+
+    restarted = SearchCache(disk_path=path)
+    assert restarted.get("k") == {"items": [1]}
+    assert restarted.get("k") == {"items": [1]}
+    stats = restarted.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_disk_layer_drops_expired_and_excess_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    expired = SearchCache(disk_path=path, disk_ttl=-1)
+    expired.set("k", 1)
+    assert SearchCache(disk_path=path, disk_ttl=-1).get("k") is None
+
+    small = SearchCache(disk_path=str(tmp_path / "small.sqlite3"), disk_size=2)
+    for key in "abc":
+        small.set(key, key)
+    assert len(small.disk) == 2
+    assert small.disk.evictions == 1
+
+
+def test_repeated_search_is_served_from_cache(backend, ctx):
+    async def main():
+        first = await server.run_search("mcp", ctx)
+        second = await server.run_search("ＭＣＰ", ctx)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second
+    assert backend.request_count == 1
+    assert server.search_cache.stats()["memory_hits"] == 1
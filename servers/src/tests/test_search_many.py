@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+import pytest
+
+import server_google_search as server
+
+
+def search_many(ctx, queries, **options) -> dict:
+    result = asyncio.run(server.google_search_many(queries, ctx, **options))
+    return result.structuredContent
+
+
+def test_returns_one_entry_per_input_and_searches_duplicates_once(backend, ctx):
+    data = search_many(ctx, ["Python", "python", "MCP", " Python "], num=2)
+    assert [item["query"] for item in data["results"]] == ["Python", "python", "MCP", " Python "]
+    assert [len(item["results"]) for item in data["results"]] == [2, 2, 2, 2]
+    assert data["results"][0]["results"] == data["results"][1]["results"]
+    assert backend.request_count == 2
+
+
+def test_queries_are_searched_concurrently(backend, ctx):
+    backend.latency = 0.2
+    started = time.monotonic()
+    search_many(ctx, ["a", "b", "c", "d"])
+    assert backend.request_count == 4
+    assert time.monotonic() - started < 0.6  # 順番に検索すると0.8秒以上かかる
+
+
+def test_invalid_query_fails_only_its_own_entry(backend, ctx):
+    data = search_many(ctx, ["mcp", "", "x" * 101])
+    errors = [item.get("error") for item in data["results"]]
+    assert errors[0] is None
+    assert "入力してください" in errors[1]
+    assert "100文字以内" in errors[2]
+    assert backend.request_count == 1
+
+
+def test_too_many_distinct_queries_are_rejected(backend, ctx):
+    with pytest.raises(ValueError, match=str(server.MAX_BATCH_QUERIES)):
+        search_many(ctx, [f"q{i}" for i in range(server.MAX_BATCH_QUERIES + 1)])
+    assert backend.request_count == 0
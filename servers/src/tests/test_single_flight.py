@@ -0,0 +1,62 @@
+import asyncio
+
+import server_google_search as server
+
+
+async def search_twice(ctx, first_bypass: bool, second_bypass: bool) -> list[dict]:
+    first = asyncio.create_task(server.run_search("mcp", ctx, bypass_cache=first_bypass))
+    await asyncio.sleep(0.05)  # 最初の検索がAPIを呼び出し中になるまで待つ
+    second = asyncio.create_task(server.run_search("mcp", ctx, bypass_cache=second_bypass))
+    return await asyncio.gather(first, second)
+
+
+def test_identical_searches_share_one_request(backend, ctx):
+    backend.latency = 0.3
+    first, second = asyncio.run(search_twice(ctx, False, False))
+    assert first == second
+    assert backend.request_count == 1
+    assert server.search_flight.stats()["coalesced"] == 1
+
+
+def test_bypass_cache_does_not_join_in_flight_search(backend, ctx):
+    backend.latency = 0.3
+    asyncio.run(search_twice(ctx, False, True))
+    assert backend.request_count == 2
+    assert server.search_flight.stats()["coalesced"] == 0
+
+
+def test_single_flight_shares_errors_and_forgets_the_key():
+    flight = server.SingleFlight()
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+
+    async def main():
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+        assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+        assert flight.stats()["in_flight"] == 0
+        await asyncio.gather(flight.do("k", fail), return_exceptions=True)
+
+    asyncio.run(main())
+    assert calls == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_search():
+    flight = server.SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def main():
+        first = asyncio.create_task(flight.do("k", slow))
+        second = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"